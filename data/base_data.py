@@ -1,5 +1,8 @@
 from abc import ABCMeta, abstractmethod
 
+from chartutil import build_bars, build_charts_multi, iter_build_charts
+from dataio import TIME_DTYPE, FixedPoint, get_dataio, rechunk
+
 
 class BaseExchange(object, metaclass=ABCMeta):
     """Abstract base class for all exchange clients that fetch historical
@@ -12,20 +15,154 @@ class BaseExchange(object, metaclass=ABCMeta):
         get_pairs()
 
     where pair is a str representing a currency pair supported by the exchange
-    and start and end are integer UNIX timestamps.
+    and start and end are UNIX timestamps, in seconds.
+
+    Clients declare `FIELDNAMES` and `DTYPES` of their stored trade data and
+    set `_savedir`, `_storage`, `_partition` and `_fixed_point` on
+    construction. `_fixed_point` maps currency pairs to the steps of columns
+    stored as int64 multiples, e.g. {'BTC-USD': {'price': 0.01,
+    'size': 1e-8}} for a tick size of 0.01 and a lot size of 1e-8. Trade
+    times are stored as `TIME_DTYPE`, int64 microseconds, so trades within a
+    second keep their order and charts can have sub-second intervals.
     """
+    # Price, size and side columns used to build charts.
+    CHART_FIELDS = ('price', 'size', 'side')
+    # Price, size and side columns used to build bars.
+    BAR_FIELDS = CHART_FIELDS
+
     @abstractmethod
     def download_data(self, pair, start, end):
         pass
 
     @abstractmethod
-    def get_trades(self, pair, start, end):
+    def get_trades(self, pair, start, end, as_arrays=False):
         pass
 
     @abstractmethod
-    def get_charts(self, pair, start, end, interval):
+    def get_charts(self, pair, start, end, interval, as_arrays=False):
         pass
 
     @abstractmethod
     def get_pairs(self):
-        pass
\ No newline at end of file
+        pass
+
+    def _get_dataio(self, pair=None):
+        """Return the storage backend that holds trade data of this client,
+        with the fixed-point columns of `pair`.
+        """
+        dtypes = dict(self.DTYPES)
+        for fieldname, step in self._fixed_point.get(pair, {}).items():
+            dtypes[fieldname] = FixedPoint(step)
+        return get_dataio(savedir=self._savedir,
+                          fieldnames=self.FIELDNAMES,
+                          dtypes=dtypes,
+                          storage=self._storage,
+                          partition=self._partition)
+
+    def _get_steps(self, pair, fields):
+        """Return the steps of the price and size columns in `fields` if any
+        of them is stored as fixed-point for `pair`, or None.
+        """
+        steps = self._fixed_point.get(pair, {})
+        if not any(fieldname in steps for fieldname in fields[:2]):
+            return None
+        return tuple(steps.get(fieldname) for fieldname in fields[:2])
+
+    def get_charts_multi(self, pair, start, end, intervals=(60, 300, 3600),
+                         as_arrays=False):
+        """Convert trade data to OHLC format at several intervals, reading
+        and aggregating trades once for all intervals.
+
+        Args:
+            pair (str): Currency pair.
+            start (int): Start UNIX of chart data to fetch.
+            end (int): End UNIX of chart data to fetch.
+            intervals (list of float): Intervals, in seconds.
+            as_arrays (bool): Return numpy arrays instead of lists.
+
+        Returns:
+            Dict of ticks keyed by interval, each equal to the result of
+            `get_charts` up to rounding of summed volumes.
+        """
+        trade_data = self.get_trades(pair, start, end, as_arrays=True)
+        return build_charts_multi(trade_data, start, end, intervals,
+                                  self.CHART_FIELDS, as_arrays,
+                                  self._get_steps(pair, self.CHART_FIELDS))
+
+    def get_bars(self, pair, start, end, bar_type='tick', threshold=1000,
+                 as_arrays=False):
+        """Convert trade data to tick, volume or dollar bars, which close
+        after `threshold` trades, units of size or price times size.
+
+        Args:
+            pair (str): Currency pair.
+            start (int): Start UNIX of trade data to fetch.
+            end (int): End UNIX of trade data to fetch.
+            bar_type (str): 'tick', 'volume' or 'dollar'.
+            threshold (float): Amount of activity in each bar.
+            as_arrays (bool): Return numpy arrays instead of lists.
+
+        Returns:
+            Dict of bar values with the keys of `get_charts`, from old to new
+            data.
+        """
+        trade_data = self.get_trades(pair, start, end, as_arrays=True)
+        return build_bars(trade_data, bar_type, threshold, self.BAR_FIELDS,
+                          as_arrays, self._get_steps(pair, self.BAR_FIELDS))
+
+    def iter_trades(self, pair, start, end, chunk_rows=100000,
+                    as_arrays=False):
+        """Iterate over trade data in chunks, reading stored files
+        incrementally so memory use does not depend on range length.
+
+        Args:
+            pair (str): Currency pair.
+            start (int): Start UNIX of trade data to fetch.
+            end (int): End UNIX of trade data to fetch.
+            chunk_rows (int): Number of trades in each chunk. The last chunk
+                may be shorter.
+            as_arrays (bool): Yield typed numpy arrays.
+
+        Yields:
+            Dicts of trade data keyed by `FIELDNAMES`, from old to new data.
+        """
+        dataio = self._get_dataio(pair)
+        if not dataio.csv_check(pair):
+            raise ValueError('{}\t| No trades downloaded: {}'.format(
+                type(self).__name__, pair))
+        for data in dataio.csv_iter_range(pair, start, end, chunk_rows,
+                                          as_arrays=as_arrays):
+            yield data
+
+    def iter_charts(self, pair, start, end, interval=60, chunk_rows=10000,
+                    as_arrays=False, trade_chunk_rows=100000):
+        """Iterate over chart data in chunks. Trades are read and aggregated
+        `trade_chunk_rows` at a time, carrying only the open bucket and the
+        last close between them, so memory use is bounded by the chunk sizes
+        whatever the range. The concatenated chunks equal the result of
+        `get_charts`.
+
+        Args:
+            pair (str): Currency pair.
+            start (int): Start UNIX of chart data to fetch.
+            end (int): End UNIX of chart data to fetch.
+            interval (float): Interval, in seconds.
+            chunk_rows (int): Number of ticks in each chunk. The last chunk
+                may be shorter.
+            as_arrays (bool): Yield numpy arrays instead of lists.
+            trade_chunk_rows (int): Number of trades read at a time.
+
+        Yields:
+            Dicts of tick values, from old to new data.
+        """
+        trade_chunks = self.iter_trades(pair, start, end, trade_chunk_rows,
+                                        as_arrays=True)
+        charts = iter_build_charts(trade_chunks, start, end, interval,
+                                   self.CHART_FIELDS,
+                                   self._get_steps(pair, self.CHART_FIELDS),
+                                   chunk_buckets=chunk_rows)
+        for chart_data in rechunk(charts, chunk_rows):
+            if not as_arrays:
+                chart_data = {key: chart_data[key].tolist()
+                              for key in chart_data}
+            yield chart_data
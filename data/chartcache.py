@@ -0,0 +1,278 @@
+import csv
+import os
+
+import numpy as np
+
+import chartutil
+from dataio import TIME_DTYPE, get_dataio
+
+
+class ChartCache:
+    """Stores bucket aggregates of chart data on disk, one file per exchange,
+    currency pair, interval and bucket alignment. Buckets are only stored up
+    to a watermark, the newest bucket that can no longer receive trades, so
+    a request reads stored buckets and aggregates only the trades after the
+    watermark.
+
+    Aggregates rather than ticks are stored: ticks are finalized over the
+    requested range, so the close is carried across the watermark exactly as
+    if all ticks were built from trades. Stored buckets assume the trade data
+    of a pair is only ever appended to, as done by `download_data`.
+
+    Buckets form a pyramid of `levels`: buckets of an interval that is a
+    multiple of a finer level are merged from buckets of the coarsest such
+    level, and only buckets of intervals without a finer level are
+    aggregated from trades.
+
+    Prices and sizes of buckets built from fixed-point trades are multiples
+    of the steps of the pair. The steps are recorded in a `<file>.steps`
+    file, and stored buckets of other steps are discarded and rebuilt, so
+    buckets of different scales are never merged.
+    """
+    STEPS_FIELDNAMES = ['price_step', 'size_step']
+    FIELDNAMES = ['time'] + list(chartutil.AGGREGATE_KEYS)
+    DTYPES = {fieldname: 'int64' if fieldname.startswith('n_') else 'float64'
+              for fieldname in FIELDNAMES}
+    # Intervals, in seconds, that coarser intervals are merged from.
+    LEVELS = (60, 300, 900, 3600, 86400)
+
+    def __init__(self, savedir='exchange_data\\charts', storage='column',
+                 levels=LEVELS):
+        self._savedir = savedir
+        self._storage = storage
+        self._levels = tuple(sorted(levels))
+
+    def _get_dataio(self, exchange):
+        """Return the storage backend that holds buckets of an exchange.
+        """
+        return get_dataio(savedir='{}\\{}'.format(self._savedir, exchange),
+                          fieldnames=self.FIELDNAMES,
+                          dtypes=self.DTYPES,
+                          storage=self._storage)
+
+    def _filename(self, pair, interval, timepoint):
+        # buckets that end at the same offset within an interval share a
+        # file. offsets are exact in time units, so alignments a fraction of
+        # a second apart do not share a file
+        offset = float(TIME_DTYPE.to_values(
+            int(TIME_DTYPE.nearest_units(timepoint)) %
+            int(TIME_DTYPE.nearest_units(interval))))
+        if offset.is_integer():
+            offset = int(offset)
+        return '{}.{}.{}'.format(pair, interval, offset)
+
+    def _steps_path(self, exchange, filename):
+        return '{}\\{}\\{}.steps'.format(self._savedir, exchange, filename)
+
+    def _read_steps(self, exchange, filename):
+        """Return the recorded steps of a bucket file as strings, or None if
+        none were recorded.
+        """
+        try:
+            with open(self._steps_path(exchange, filename), 'r',
+                      newline='') as f:
+                row = next(csv.DictReader(f), None)
+        except FileNotFoundError:
+            return None
+        if row is None:
+            return None
+        return [row[fieldname] for fieldname in self.STEPS_FIELDNAMES]
+
+    def _write_steps(self, exchange, filename, steps):
+        steps_path = self._steps_path(exchange, filename)
+        with open(steps_path + '.tmp', 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(self.STEPS_FIELDNAMES)
+            w.writerow(steps)
+        os.replace(steps_path + '.tmp', steps_path)
+
+    def _check_steps(self, client, dataio, exchange, pair, filename):
+        """Discard stored buckets that were not built at the steps `client`
+        stores `pair` with, then record those steps.
+        """
+        steps = client._get_steps(pair, client.CHART_FIELDS) or (None, None)
+        steps = ['' if step is None else repr(float(step)) for step in steps]
+        if dataio.csv_check(filename):
+            if self._read_steps(exchange, filename) == steps:
+                return
+            # buckets of unknown or other steps are of another scale
+            dataio.csv_newfile(filename)
+        self._write_steps(exchange, filename, steps)
+
+    def _parent_interval(self, interval):
+        """Return the coarsest level finer than `interval` that divides it, or
+        None if buckets of `interval` are aggregated from trades.
+        """
+        parents = [level for level in self._levels
+                   if level < interval and interval % level == 0]
+        if len(parents) == 0:
+            return None
+        return parents[-1]
+
+    def _build(self, client, exchange, pair, timepoints, interval):
+        """Build contiguous buckets ending at `timepoints`, merging buckets of
+        the parent level or aggregating trades.
+        """
+        parent = self._parent_interval(interval)
+        if parent is None:
+            trade_data = client.get_trades(pair, timepoints[0] - interval,
+                                           timepoints[-1], as_arrays=True)
+            return chartutil.aggregate(trade_data, timepoints, interval,
+                                       client.CHART_FIELDS)
+
+        factor = int(round(interval / parent))
+        parent_timepoints = (timepoints[0] - interval + parent +
+                             parent * np.arange(len(timepoints) * factor))
+        agg = self._get_aggregates(client, exchange, pair, parent_timepoints,
+                                   parent)
+        return chartutil.rollup(agg, factor)
+
+    def _get_aggregates(self, client, exchange, pair, timepoints, interval):
+        """Fetch contiguous buckets ending at `timepoints`. Stored buckets are
+        read from disk, buckets after the watermark are built and those
+        closed by the newest stored trade are appended to the cache. Buckets
+        before the first stored bucket are built and not stored.
+
+        Returns:
+            Dict of numpy arrays keyed by `chartutil.AGGREGATE_KEYS`.
+        """
+        # intervals of stored buckets are whole seconds
+        interval = int(interval)
+        dataio = self._get_dataio(exchange)
+        filename = self._filename(pair, interval, timepoints[0])
+        self._check_steps(client, dataio, exchange, pair, filename)
+        # undo an interrupted commit before the watermark is read
+        dataio.csv_recover(filename)
+        last_row = dataio.csv_get_last(filename)
+        watermark = None if last_row is None else float(last_row['time'])
+
+        # stored buckets within the requested range
+        cached = dataio.csv_get_range(filename, timepoints[0],
+                                      timepoints[-1], as_arrays=True)
+        mask = cached['time'] >= timepoints[0]
+        cached = {key: np.asarray(cached[key])[mask] for key in cached}
+
+        # find the buckets before and after the stored buckets
+        if len(cached['time']) > 0:
+            head_end = cached['time'][0]
+            new_start = watermark + interval
+        elif watermark is None:
+            head_end = timepoints[0]
+            new_start = timepoints[0]
+        elif timepoints[0] <= watermark:
+            # requested range ends before the first stored bucket
+            head_end = timepoints[-1] + interval
+            new_start = timepoints[-1] + interval
+        else:
+            head_end = timepoints[0]
+            new_start = watermark + interval
+
+        parts = []
+        head_timepoints = timepoints[timepoints < head_end]
+        if len(head_timepoints) > 0:
+            parts.append(self._build(client, exchange, pair, head_timepoints,
+                                     interval))
+        if len(cached['time']) > 0:
+            parts.append(cached)
+
+        # new buckets start right after the watermark, so stored buckets
+        # stay contiguous even if they are not requested
+        new_timepoints = np.arange(new_start, timepoints[-1] + 1, interval)
+        if len(new_timepoints) > 0:
+            agg = self._build(client, exchange, pair, new_timepoints,
+                              interval)
+            agg['time'] = new_timepoints
+
+            # a bucket is closed once a newer trade is stored
+            last_trade = client._get_dataio(pair).csv_get_last(pair)
+            n_closed = 0
+            if last_trade is not None:
+                n_closed = np.searchsorted(new_timepoints,
+                                           float(last_trade['time']), 'left')
+            if n_closed > 0:
+                with dataio.csv_writer(filename) as writer:
+                    writer.append([
+                        dict(zip(self.FIELDNAMES, values))
+                        for values in zip(*[agg[key][:n_closed].tolist()
+                                            for key in self.FIELDNAMES])])
+
+            requested = new_timepoints >= timepoints[0]
+            parts.append({key: agg[key][requested] for key in agg})
+
+        return {key: np.concatenate([part[key] for part in parts])
+                for key in chartutil.AGGREGATE_KEYS}
+
+    def get_charts(self, client, exchange, pair, start, end, interval=60,
+                   as_arrays=False):
+        """Convert trade data to OHLC format, reusing stored buckets. Ticks of
+        an interval that is a multiple of a level are merged from buckets of
+        that level without reading trades that are already aggregated.
+
+        Args:
+            client (BaseExchange): Client holding trade data of `exchange`.
+            exchange (str): Name of exchange.
+            pair (str): Currency pair.
+            start (int): Start UNIX of chart data.
+            end (int): End UNIX of chart data.
+            interval (int): Interval, in seconds.
+            as_arrays (bool): Return numpy arrays instead of lists.
+
+        Returns:
+            Dict of tick values, from old to new data. Equal to the result of
+            `client.get_charts`, up to rounding of summed volumes.
+        """
+        timepoints = chartutil.bucket_ends(start, end, interval)
+        # sub-second buckets are not stored
+        if len(timepoints) == 0 or interval % 1 != 0:
+            return client.get_charts(pair, start, end, interval,
+                                     as_arrays=as_arrays)
+
+        # whole seconds given as float share the buckets of int intervals
+        interval = int(interval)
+        agg = self._get_aggregates(client, exchange, pair, timepoints,
+                                   interval)
+        chart_data = chartutil.finalize(
+            agg, timepoints, steps=client._get_steps(pair, client.CHART_FIELDS))
+        if as_arrays:
+            return chart_data
+        return {key: chart_data[key].tolist() for key in chart_data}
+
+    def get_charts_multi(self, client, exchange, pair, start, end,
+                         intervals=(60, 300, 3600), as_arrays=False):
+        """Convert trade data to OHLC format at several intervals. Buckets of
+        the greatest common divisor of `intervals` are fetched once and
+        merged into ticks of each interval. If that divisor is not a multiple
+        of the finest level, ticks are built from trades by
+        `client.get_charts_multi` without the cache.
+
+        Args:
+            client (BaseExchange): Client holding trade data of `exchange`.
+            exchange (str): Name of exchange.
+            pair (str): Currency pair.
+            start (int): Start UNIX of chart data.
+            end (int): End UNIX of chart data.
+            intervals (list of int): Intervals, in seconds.
+            as_arrays (bool): Return numpy arrays instead of lists.
+
+        Returns:
+            Dict of tick values keyed by interval, from old to new data.
+        """
+        base = chartutil.interval_gcd(intervals)
+        base_timepoints = chartutil.bucket_ends(start, end, base)
+        if base % self._levels[0] != 0 or len(base_timepoints) == 0:
+            return client.get_charts_multi(pair, start, end, intervals,
+                                           as_arrays=as_arrays)
+
+        base_agg = self._get_aggregates(client, exchange, pair,
+                                        base_timepoints, base)
+        steps = client._get_steps(pair, client.CHART_FIELDS)
+        charts = {}
+        for interval in intervals:
+            timepoints = chartutil.bucket_ends(start, end, interval)
+            agg = chartutil.rollup(base_agg, int(round(interval / base)))
+            chart_data = chartutil.finalize(agg, timepoints, steps=steps)
+            if not as_arrays:
+                chart_data = {key: chart_data[key].tolist()
+                              for key in chart_data}
+            charts[interval] = chart_data
+        return charts
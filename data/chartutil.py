@@ -0,0 +1,511 @@
+import functools
+import math
+
+import numpy as np
+
+from dataio import TIME_DTYPE, FixedPoint
+
+
+# Bar types of `build_bars`.
+BAR_TYPES = ('tick', 'volume', 'dollar')
+
+CHART_KEYS = ('time', 'open', 'high', 'low', 'close', 'volume',
+              'weighted_average', 'n_trades', 'n_sells', 'sell_volume',
+              'sell_weighted_average', 'n_buys', 'buy_volume',
+              'buy_weighted_average')
+
+# Per-bucket values computed from trades, from which ticks are finalized.
+AGGREGATE_KEYS = ('n_rows', 'first', 'high', 'low', 'last', 'volume',
+                  'notional', 'n_buys', 'buy_volume', 'buy_notional',
+                  'n_sells', 'sell_volume', 'sell_notional')
+
+
+def _time_units(unix):
+    """Convert UNIX times into int64 units of `TIME_DTYPE`.
+    """
+    return TIME_DTYPE.nearest_units(unix)
+
+
+def bucket_ends(start, end, interval):
+    """Return the end times of buckets of `interval` seconds after `start`
+    and before `end`. Times are computed in units of `TIME_DTYPE`, so
+    fractional intervals such as 0.1 do not accumulate rounding errors.
+
+    Args:
+        start (float): Start UNIX of chart data.
+        end (float): End UNIX of chart data.
+        interval (float): Interval, in seconds.
+
+    Returns:
+        A float64 numpy array of UNIX times.
+    """
+    interval_units = int(_time_units(interval))
+    if interval_units <= 0:
+        raise ValueError('Interval must be at least {} seconds'.format(
+            TIME_DTYPE.step))
+    start_units, end_units = _time_units(start), _time_units(end)
+    return TIME_DTYPE.to_values(np.arange(start_units + interval_units,
+                                          end_units, interval_units))
+
+
+def interval_gcd(intervals):
+    """Return the greatest common divisor of intervals, in seconds. Whole
+    seconds are returned as int, fractions of seconds as float.
+    """
+    if len(intervals) == 0:
+        raise ValueError('No chart intervals given')
+    units = functools.reduce(math.gcd, [int(_time_units(interval))
+                                        for interval in intervals])
+    seconds = float(TIME_DTYPE.to_values(units))
+    if seconds.is_integer():
+        return int(seconds)
+    return seconds
+
+
+def aggregate(trade_data, timepoints, interval,
+              fields=('price', 'size', 'side')):
+    """Aggregate trades into buckets ending at `timepoints`. The bucket of
+    time t holds trades after t - interval up to and including t, so
+    consecutive buckets tile time and merged buckets hold the same trades as
+    a bucket of the merged interval. Every value is computed for all buckets
+    at once with segment reductions.
+
+    Args:
+        trade_data (dict): Trade data from `get_trades` as numpy arrays, from
+            old to new. Times are int64 units of `TIME_DTYPE`.
+        timepoints (numpy.ndarray): Sorted end times of buckets.
+        interval (float): Interval, in seconds.
+        fields (tuple of str): Names of the price, size and side columns of
+            `trade_data`.
+
+    Returns:
+        Dict of numpy arrays keyed by `AGGREGATE_KEYS`, one value per
+        bucket. Prices of empty buckets are NaN.
+    """
+    n_buckets = len(timepoints)
+    times = np.asarray(trade_data['time'], dtype=np.int64)
+    ends = _time_units(timepoints)
+
+    # assign each trade to the first bucket ending at or after it, and drop
+    # trades that fall before the start of that bucket
+    buckets = np.searchsorted(ends, times, 'left')
+    valid = buckets < n_buckets
+    valid[valid] = (times[valid] >
+                    ends[buckets[valid]] - _time_units(interval))
+    return _reduce_buckets(trade_data, buckets[valid], n_buckets, fields,
+                           valid)
+
+
+def _reduce_buckets(trade_data, buckets, n_buckets, fields, selected=None):
+    """Compute `AGGREGATE_KEYS` of trades assigned to sorted bucket numbers.
+
+    Args:
+        trade_data (dict): Trade data from `get_trades`, from old to new.
+        buckets (numpy.ndarray): Bucket number of each selected trade.
+        n_buckets (int): Number of buckets.
+        fields (tuple of str): Names of the price, size and side columns.
+        selected (numpy.ndarray, optional): Boolean mask selecting the
+            trades of `buckets` from `trade_data`. All trades if not given.
+
+    Returns:
+        Dict of numpy arrays keyed by `AGGREGATE_KEYS`, one value per
+        bucket. Prices of empty buckets are NaN.
+    """
+    price_field, size_field, side_field = fields
+    if selected is None:
+        selected = slice(None)
+    prices = np.asarray(trade_data[price_field], dtype=np.float64)[selected]
+    sizes = np.asarray(trade_data[size_field], dtype=np.float64)[selected]
+    sides = np.asarray(trade_data[side_field])[selected]
+    is_buy = (sides == 'buy') | (sides == 'b')
+    is_sell = (sides == 'sell') | (sides == 's')
+
+    agg = {}
+    agg['n_rows'] = np.bincount(buckets, minlength=n_buckets)
+    for key in ('first', 'high', 'low', 'last'):
+        agg[key] = np.full(n_buckets, np.nan)
+    if len(buckets) > 0:
+        starts = np.flatnonzero(np.diff(buckets, prepend=-1))
+        ends = np.append(starts[1:], len(buckets)) - 1
+        filled = buckets[starts]
+        agg['first'][filled] = prices[starts]
+        agg['high'][filled] = np.maximum.reduceat(prices, starts)
+        agg['low'][filled] = np.minimum.reduceat(prices, starts)
+        agg['last'][filled] = prices[ends]
+
+    notional = prices * sizes
+    agg['volume'] = np.bincount(buckets, sizes, n_buckets)
+    agg['notional'] = np.bincount(buckets, notional, n_buckets)
+    for side, mask in (('buy', is_buy), ('sell', is_sell)):
+        agg['n_{}s'.format(side)] = np.bincount(buckets[mask],
+                                                minlength=n_buckets)
+        agg['{}_volume'.format(side)] = np.bincount(
+            buckets[mask], sizes[mask], n_buckets)
+        agg['{}_notional'.format(side)] = np.bincount(
+            buckets[mask], notional[mask], n_buckets)
+    return agg
+
+
+def rollup(agg, factor):
+    """Merge every `factor` consecutive buckets into one bucket. Counts,
+    volumes and notionals are summed, so weighted averages of merged buckets
+    are recombined from notional. Trailing buckets that do not fill a merged
+    bucket are dropped.
+
+    Args:
+        agg (dict): Bucket aggregates from `aggregate`, from old to new.
+        factor (int): Number of buckets merged into one.
+
+    Returns:
+        Dict of numpy arrays keyed by `AGGREGATE_KEYS`, one value per merged
+        bucket.
+    """
+    n_buckets = len(agg['n_rows']) // factor
+    n_merged = n_buckets * factor
+    if n_buckets == 0:
+        return {key: np.asarray(agg[key])[:0] for key in AGGREGATE_KEYS}
+    starts = np.arange(n_buckets) * factor
+
+    merged = {}
+    for key in AGGREGATE_KEYS:
+        if key not in ('first', 'high', 'low', 'last'):
+            merged[key] = np.add.reduceat(np.asarray(agg[key])[:n_merged],
+                                          starts)
+
+    # prices of empty buckets are NaN and skipped by fmax and fmin
+    merged['high'] = np.fmax.reduceat(np.asarray(agg['high'])[:n_merged],
+                                      starts)
+    merged['low'] = np.fmin.reduceat(np.asarray(agg['low'])[:n_merged],
+                                     starts)
+
+    # take the first and last price of the first and last filled buckets
+    index = np.arange(n_merged)
+    filled = np.asarray(agg['n_rows'])[:n_merged] > 0
+    first_index = np.minimum.reduceat(np.where(filled, index, n_merged),
+                                      starts)
+    last_index = np.maximum.reduceat(np.where(filled, index, -1), starts)
+    has_trades = last_index >= 0
+    merged['first'] = np.where(
+        has_trades, np.asarray(agg['first'])[first_index % n_merged], np.nan)
+    merged['last'] = np.where(
+        has_trades, np.asarray(agg['last'])[last_index], np.nan)
+    return {key: merged[key] for key in AGGREGATE_KEYS}
+
+
+def _scale(agg, steps):
+    """Convert aggregates of int64 multiples of steps into decimal values.
+    """
+    price_step, size_step = [1 if step is None else step for step in steps]
+    scales = {'first': price_step, 'high': price_step, 'low': price_step,
+              'last': price_step}
+    for prefix in ('', 'buy_', 'sell_'):
+        scales[prefix + 'volume'] = size_step
+        scales[prefix + 'notional'] = price_step * size_step
+    return {key: FixedPoint(scales[key]).to_values(agg[key])
+            if key in scales else agg[key] for key in agg}
+
+
+def finalize(agg, timepoints, last_close=None, steps=None):
+    """Convert bucket aggregates into ticks. A tick opens at the close of
+    the previous tick, or at its first price if it is the first tick and
+    `last_close` is not given. Ticks without trades carry the previous close
+    forward, or 0 if there is none.
+
+    Args:
+        agg (dict): Bucket aggregates from `aggregate`.
+        timepoints (numpy.ndarray): End times of buckets.
+        last_close (float, optional): Close of the tick before the first
+            bucket.
+        steps (tuple, optional): Steps of the price and size columns that
+            hold int64 multiples of their step (`dataio.FixedPoint`), or None
+            for a column of decimal values. Ticks are then float64 instead
+            of float32.
+
+    Returns:
+        Dict of numpy arrays keyed by `CHART_KEYS`.
+    """
+    float_dtype = np.float32
+    if steps is not None:
+        # sums of multiples are exact and only scaled back once
+        agg = _scale(agg, steps)
+        float_dtype = np.float64
+    n_buckets = len(timepoints)
+    filled = agg['n_rows'] > 0
+    initial_close = 0 if last_close is None else last_close
+
+    # carry the last price of the latest filled bucket forward
+    latest = np.maximum.accumulate(np.where(filled, np.arange(n_buckets), -1))
+    close = np.where(latest >= 0, agg['last'][latest], initial_close)
+    carry = np.empty(n_buckets)
+    if n_buckets > 0:
+        carry[1:] = close[:-1]
+        if last_close is None and filled[0]:
+            carry[0] = agg['first'][0]
+        else:
+            carry[0] = initial_close
+
+    def ratio(notional, volume, fallback):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(fallback, carry, notional / volume)
+
+    chart_data = {}
+    chart_data['time'] = np.asarray(timepoints)
+    chart_data['open'] = carry
+    chart_data['high'] = np.where(filled, agg['high'], carry)
+    chart_data['low'] = np.where(filled, agg['low'], carry)
+    chart_data['close'] = close
+    chart_data['volume'] = agg['volume']
+    chart_data['weighted_average'] = ratio(agg['notional'], agg['volume'],
+                                           ~filled)
+    chart_data['n_trades'] = agg['n_buys'] + agg['n_sells']
+    for side in ('sell', 'buy'):
+        n_side = agg['n_{}s'.format(side)]
+        chart_data['n_{}s'.format(side)] = n_side
+        chart_data['{}_volume'.format(side)] = agg['{}_volume'.format(side)]
+        chart_data['{}_weighted_average'.format(side)] = ratio(
+            agg['{}_notional'.format(side)], agg['{}_volume'.format(side)],
+            n_side == 0)
+
+    for key in CHART_KEYS:
+        if key not in ('time', 'n_trades', 'n_sells', 'n_buys'):
+            chart_data[key] = chart_data[key].astype(float_dtype)
+    return {key: chart_data[key] for key in CHART_KEYS}
+
+
+def build_charts(trade_data, start, end, interval,
+                 fields=('price', 'size', 'side'), last_close=None,
+                 as_arrays=False, steps=None):
+    """Convert trade data to OHLC format.
+
+    Args:
+        trade_data (dict): Trade data from `get_trades` as numpy arrays, from
+            old to new.
+        start (float): Start UNIX of chart data.
+        end (float): End UNIX of chart data.
+        interval (float): Interval, in seconds. Fractional intervals such as
+            0.1 build sub-second ticks.
+        fields (tuple of str): Names of the price, size and side columns of
+            `trade_data`.
+        last_close (float, optional): Close of the tick before `start`, used
+            as the opening price of the first tick.
+        as_arrays (bool): Return numpy arrays instead of lists.
+        steps (tuple, optional): Steps of fixed-point price and size
+            columns, see `finalize`.
+
+    Returns:
+        Dict of tick values, from old to new data.
+    """
+    timepoints = bucket_ends(start, end, interval)
+    agg = aggregate(trade_data, timepoints, interval, fields)
+    chart_data = finalize(agg, timepoints, last_close, steps)
+    if as_arrays:
+        return chart_data
+    return {key: chart_data[key].tolist() for key in chart_data}
+
+
+def _merge_open(open_agg, agg):
+    """Merge the aggregate of an open bucket into the first bucket of `agg`.
+    """
+    if open_agg is None:
+        return agg
+    merged = rollup({key: np.concatenate([open_agg[key], agg[key][:1]])
+                     for key in AGGREGATE_KEYS}, 2)
+    return {key: np.concatenate([merged[key], agg[key][1:]])
+            for key in AGGREGATE_KEYS}
+
+
+def iter_build_charts(trade_chunks, start, end, interval,
+                      fields=('price', 'size', 'side'), steps=None,
+                      chunk_buckets=10000):
+    """Convert chunks of trade data to OHLC format without holding all
+    trades or all buckets in memory. Between chunks only the aggregate of
+    the open bucket, the latest bucket that later trades may still fall in,
+    the last close and the position of the open bucket are kept, so the
+    concatenated ticks equal those of `build_charts` over all trades.
+
+    Args:
+        trade_chunks (iterable of dict): Chunks of trade data from
+            `iter_trades` as numpy arrays, from old to new.
+        start (float): Start UNIX of chart data.
+        end (float): End UNIX of chart data.
+        interval (float): Interval, in seconds.
+        fields (tuple of str): Names of the price, size and side columns of
+            the trade data.
+        steps (tuple, optional): Steps of fixed-point price and size
+            columns, see `finalize`.
+        chunk_buckets (int): Maximum number of ticks yielded at a time, which
+            bounds memory use across gaps without trades and long ranges.
+
+    Yields:
+        Dicts of numpy arrays keyed by `CHART_KEYS`, holding the ticks
+        completed by each chunk of trades.
+    """
+    interval_units = int(_time_units(interval))
+    if interval_units <= 0:
+        raise ValueError('Interval must be at least {} seconds'.format(
+            TIME_DTYPE.step))
+    start_units = int(_time_units(start))
+    n_buckets = len(range(start_units + interval_units,
+                          int(_time_units(end)), interval_units))
+    if n_buckets == 0:
+        return
+
+    def bucket_range(first, stop):
+        # end times of buckets `first` to `stop` - 1, as in `bucket_ends`
+        return TIME_DTYPE.to_values(
+            start_units + interval_units * np.arange(first + 1, stop + 1))
+
+    price_field, size_field, side_field = fields
+    no_trades = {'time': np.empty(0, dtype=np.int64), price_field: np.empty(0),
+                 size_field: np.empty(0), side_field: np.empty(0, dtype=str)}
+    n_done = 0
+    open_agg = None
+    last_close = None
+
+    def close_buckets(trade_data, stop):
+        # finalize buckets `n_done` to `stop` - 1 at most `chunk_buckets` at
+        # a time, each with the trades up to its last bucket end
+        nonlocal n_done, open_agg, last_close
+        times = np.asarray(trade_data['time'], dtype=np.int64)
+        position = 0
+        while n_done < stop:
+            piece_stop = min(stop, n_done + chunk_buckets)
+            timepoints = bucket_range(n_done, piece_stop)
+            piece_end = np.searchsorted(
+                times, start_units + interval_units * piece_stop, 'right')
+            piece = {key: trade_data[key][position:piece_end]
+                     for key in trade_data}
+            agg = _merge_open(open_agg, aggregate(piece, timepoints, interval,
+                                                  fields))
+            open_agg = None
+            chart_data = finalize(agg, timepoints, last_close, steps)
+            last_close = chart_data['close'][-1]
+            position = piece_end
+            n_done = piece_stop
+            yield chart_data
+        return position
+
+    for trade_data in trade_chunks:
+        if len(trade_data['time']) == 0:
+            continue
+
+        # the bucket of the latest trade stays open for the next chunk
+        latest = -(-(int(trade_data['time'][-1]) - start_units) //
+                   interval_units) - 1
+        last = min(max(latest, n_done), n_buckets - 1)
+        position = yield from close_buckets(trade_data, last)
+        rest = {key: trade_data[key][position:] for key in trade_data}
+        open_agg = _merge_open(open_agg, aggregate(
+            rest, bucket_range(last, last + 1), interval, fields))
+
+    # no trades follow, so the open bucket and all later buckets are closed
+    yield from close_buckets(no_trades, n_buckets)
+
+
+def build_charts_multi(trade_data, start, end, intervals,
+                       fields=('price', 'size', 'side'), as_arrays=False,
+                       steps=None):
+    """Convert trade data to OHLC format at several intervals in one pass.
+    Trades are aggregated once into buckets of the greatest common divisor
+    of `intervals`, which are merged into ticks of each interval. If there
+    are more such buckets than trades, each interval is aggregated from the
+    trades directly instead.
+
+    Args:
+        trade_data (dict): Trade data from `get_trades` as numpy arrays, from
+            old to new.
+        start (float): Start UNIX of chart data.
+        end (float): End UNIX of chart data.
+        intervals (list of float): Intervals, in seconds.
+        fields (tuple of str): Names of the price, size and side columns of
+            `trade_data`.
+        as_arrays (bool): Return numpy arrays instead of lists.
+        steps (tuple, optional): Steps of fixed-point price and size
+            columns, see `finalize`.
+
+    Returns:
+        Dict of tick values keyed by interval, from old to new data.
+    """
+    base = interval_gcd(intervals)
+    base_timepoints = bucket_ends(start, end, base)
+    base_agg = None
+    if len(base_timepoints) <= len(trade_data['time']):
+        base_agg = aggregate(trade_data, base_timepoints, base, fields)
+
+    charts = {}
+    for interval in intervals:
+        timepoints = bucket_ends(start, end, interval)
+        if base_agg is not None:
+            agg = rollup(base_agg, int(round(interval / base)))
+        else:
+            agg = aggregate(trade_data, timepoints, interval, fields)
+        chart_data = finalize(agg, timepoints, steps=steps)
+        if not as_arrays:
+            chart_data = {key: chart_data[key].tolist()
+                          for key in chart_data}
+        charts[interval] = chart_data
+    return charts
+
+
+def build_bars(trade_data, bar_type, threshold,
+               fields=('price', 'size', 'side'), as_arrays=False, steps=None):
+    """Convert trade data to bars that close after a fixed amount of
+    activity instead of time. Tick bars hold `threshold` trades, volume bars
+    `threshold` units of size and dollar bars `threshold` of price times
+    size. A trade belongs to bar k if the running total before it is at
+    least k * `threshold` and below (k + 1) * `threshold`, so a bar closes on
+    the trade that crosses its threshold and the excess counts towards the
+    next bar. The last bar may be incomplete.
+
+    Args:
+        trade_data (dict): Trade data from `get_trades` as numpy arrays, from
+            old to new.
+        bar_type (str): One of `BAR_TYPES`.
+        threshold (float): Amount of activity in each bar.
+        fields (tuple of str): Names of the price, size and side columns of
+            `trade_data`.
+        as_arrays (bool): Return numpy arrays instead of lists.
+        steps (tuple, optional): Steps of fixed-point price and size
+            columns, see `finalize`.
+
+    Returns:
+        Dict of bar values keyed by `CHART_KEYS`, from old to new data. The
+        time of a bar is the time of its last trade and it opens at its first
+        price.
+    """
+    if bar_type not in BAR_TYPES:
+        raise ValueError('Bar type {} not found'.format(bar_type))
+    if threshold <= 0:
+        raise ValueError('Bar threshold must be positive')
+    price_field, size_field, _ = fields
+    price_step, size_step = [FixedPoint(1 if step is None else step)
+                             for step in (steps or (None, None))]
+    times = TIME_DTYPE.to_values(np.asarray(trade_data['time'],
+                                            dtype=np.int64))
+    if bar_type == 'tick':
+        activity = np.ones(len(times))
+    else:
+        activity = size_step.to_values(
+            np.asarray(trade_data[size_field], dtype=np.float64))
+        if bar_type == 'dollar':
+            activity = activity * price_step.to_values(
+                np.asarray(trade_data[price_field], dtype=np.float64))
+
+    # number bars by the running total before each trade, skipping numbers
+    # of thresholds crossed by a single trade
+    totals = np.cumsum(activity) - activity
+    thresholds = np.floor(totals / threshold)
+    changes = np.diff(thresholds, prepend=-1) > 0
+    buckets = np.cumsum(changes) - 1
+    n_bars = int(buckets[-1]) + 1 if len(buckets) > 0 else 0
+
+    agg = _reduce_buckets(trade_data, buckets, n_bars, fields)
+    ends = np.append(np.flatnonzero(changes)[1:], len(times)) - 1
+    chart_data = finalize(agg, times[ends] if n_bars > 0 else times[:0],
+                          steps=steps)
+    # bars open at their first price rather than the previous close
+    chart_data['open'] = price_step.to_values(agg['first']).astype(
+        chart_data['open'].dtype)
+    if as_arrays:
+        return chart_data
+    return {key: chart_data[key].tolist() for key in chart_data}
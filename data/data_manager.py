@@ -1,15 +1,60 @@
+import os
+from multiprocessing import Pool
 from multiprocessing.pool import ThreadPool
 
+import numpy as np
+
 from binance_data import Binance
 from bitmex_data import Bitmex
+from chartcache import ChartCache
+from chartutil import CHART_KEYS, bucket_ends
 from gdax_data import Gdax
 from kraken_data import Kraken
 from poloniex_data import Poloniex
 
 
+def _save_charts(task):
+    """Build chart data of a currency pair in a worker process and save each
+    key as a .npy file.
+
+    Args:
+        task (tuple): Client class, client keyword arguments, exchange name,
+            pair, start UNIX, end UNIX, interval, directory of saved arrays
+            and whether to use the chart cache.
+
+    Returns:
+        A (exchange, pair, paths) tuple, where paths maps chart keys to saved
+        files, or is None if no trades of the pair are stored.
+    """
+    (client_class, client_kwargs, exchange, pair, start_unix, end_unix,
+     interval, savedir, cache_charts) = task
+    client = client_class(**client_kwargs)
+    if not client._get_dataio(pair).csv_check(pair, create_file=False):
+        return exchange, pair, None
+
+    if cache_charts:
+        chart_data = ChartCache().get_charts(client, exchange, pair,
+                                             start_unix, end_unix, interval,
+                                             as_arrays=True)
+    else:
+        chart_data = client.get_charts(pair, start_unix, end_unix, interval,
+                                       as_arrays=True)
+    paths = {}
+    for key, array in chart_data.items():
+        paths[key] = '{}\\{}.{}.{}.{}.npy'.format(savedir, exchange, pair,
+                                                 interval, key)
+        np.save(paths[key], array)
+    return exchange, pair, paths
+
+
 class DataManager:
 
-    def __init__(self):
+    def __init__(self, storage='csv', partition=None, cache_charts=True,
+                 fixed_point=None):
+        self._storage = storage
+        self._partition = partition
+        self._fixed_point = fixed_point or {}
+        self._chart_cache = ChartCache() if cache_charts else None
         self._all_clients = {
             'binance': Binance,
             'bitmex': Bitmex,
@@ -18,7 +63,7 @@ class DataManager:
             'poloniex': Poloniex,
         }
         self._all_pairs = {
-            exchange_name: self._all_clients[exchange_name]().get_pairs()
+            exchange_name: self.get_client(exchange_name).get_pairs()
             for exchange_name in self._all_clients
         }
 
@@ -30,13 +75,19 @@ class DataManager:
     def all_pairs(self):
         return self._all_pairs
 
+    def _client_kwargs(self, exchange_name):
+        return {'storage': self._storage,
+                'partition': self._partition,
+                'fixed_point': self._fixed_point.get(exchange_name)}
+
     def get_client(self, exchange_name):
         """Return an instance of exchange client.
 
         Args:
             exchange_name (str): Name of exchange.
         """
-        return self.all_clients[exchange_name]()
+        return self.all_clients[exchange_name](
+            **self._client_kwargs(exchange_name))
 
     def get_pairs(self, exchange_name):
         """Return a list of currency pairs supported by an exchange.
@@ -50,7 +101,8 @@ class DataManager:
                    exchange,
                    pair,
                    start_unix,
-                   end_unix):
+                   end_unix,
+                   as_arrays=False):
         """Get trade data from specified exchange and currency pair.
 
         Args:
@@ -58,6 +110,7 @@ class DataManager:
             pair (str): Name of currency pair.
             start_unix (int): Start UNIX of trade data.
             end_unit (int): End UNIX of trade data.
+            as_arrays (bool): Return typed numpy arrays.
 
         Returns:
             Trade data in the range `start_unix` to `end_unix` from the
@@ -70,19 +123,21 @@ class DataManager:
                 pair, exchange))
 
         # download relevant data
-        client = self._all_clients[exchange]()
+        client = self.get_client(exchange)
         client.download_data(pair=pair, start=start_unix, end=end_unix)
 
         # get trades from client
-        client = self._all_clients[exchange]()
-        return client.get_trades(pair, start_unix, end_unix)
+        client = self.get_client(exchange)
+        return client.get_trades(pair, start_unix, end_unix,
+                                 as_arrays=as_arrays)
 
     def get_charts(self,
                    exchange,
                    pair,
                    start_unix,
                    end_unix,
-                   interval=60):
+                   interval=60,
+                   as_arrays=False):
         """Get chart data from specified exchange and currency pair.
 
         keys: {
@@ -98,6 +153,8 @@ class DataManager:
             pair (str): Name of currency pair.
             start_unix (int): Start UNIX of chart data.
             end_unit (int): End UNIX of chart data.
+            interval (int): Interval, in seconds.
+            as_arrays (bool): Return numpy arrays instead of lists.
 
         Returns:
             Chart data in the range `start_unix` to `end_unix` from the
@@ -110,12 +167,178 @@ class DataManager:
                 pair, exchange))
 
         # download relevant data
-        client = self._all_clients[exchange]()
+        client = self.get_client(exchange)
         client.download_data(pair=pair, start=start_unix, end=end_unix)
 
-        # get charts from client
-        client = self._all_clients[exchange]()
-        return client.get_charts(pair, start_unix, end_unix, interval)
+        # get charts from client, reusing closed ticks stored on disk
+        client = self.get_client(exchange)
+        if self._chart_cache is not None:
+            return self._chart_cache.get_charts(client, exchange, pair,
+                                                start_unix, end_unix,
+                                                interval, as_arrays=as_arrays)
+        return client.get_charts(pair, start_unix, end_unix, interval,
+                                 as_arrays=as_arrays)
+
+    def get_panel(self,
+                  instruments,
+                  start_unix,
+                  end_unix,
+                  interval=60,
+                  fields=('open', 'high', 'low', 'close', 'volume'),
+                  dtype=np.float64):
+        """Get chart data of several instruments as one array on a common
+        time grid, ending at start_unix + interval, start_unix + 2 * interval
+        and so on up to `end_unix`. Ticks of each instrument carry their
+        close forward as in `get_charts`.
+
+        Args:
+            instruments (list of tuple): (exchange, pair) tuples.
+            start_unix (int): Start UNIX of chart data.
+            end_unit (int): End UNIX of chart data.
+            interval (int): Interval, in seconds.
+            fields (list of str): Chart keys, see `get_charts`.
+            dtype (numpy.dtype): Type of returned values.
+
+        Returns:
+            A numpy array of shape (instrument, time, field).
+        """
+        for field in fields:
+            if field not in CHART_KEYS:
+                raise ValueError('Chart field {} not found'.format(field))
+
+        n_ticks = len(bucket_ends(start_unix, end_unix, interval))
+        panel = np.empty((len(instruments), n_ticks, len(fields)),
+                         dtype=dtype)
+        for i, (exchange, pair) in enumerate(instruments):
+            chart_data = self.get_charts(exchange, pair, start_unix, end_unix,
+                                         interval, as_arrays=True)
+            for j, field in enumerate(fields):
+                panel[i, :, j] = chart_data[field]
+        return panel
+
+    def get_charts_multi(self,
+                         exchange,
+                         pair,
+                         start_unix,
+                         end_unix,
+                         intervals=(60, 300, 3600),
+                         as_arrays=False):
+        """Get chart data at several intervals from specified exchange and
+        currency pair, reading trade data once for all intervals.
+
+        Args:
+            exchange (str): Name of exchange.
+            pair (str): Name of currency pair.
+            start_unix (int): Start UNIX of chart data.
+            end_unit (int): End UNIX of chart data.
+            intervals (list of int): Intervals, in seconds.
+            as_arrays (bool): Return numpy arrays instead of lists.
+
+        Returns:
+            Dict of chart data keyed by interval, in the range `start_unix` to
+            `end_unix` from the specified exchange and currency pair.
+        """
+        if exchange not in self._all_clients:
+            raise ValueError('Exchange {} not found'.format(exchange))
+        if pair not in self._all_pairs[exchange]:
+            raise ValueError('Currency pair {} not found in exchange {}'.format(
+                pair, exchange))
+
+        # download relevant data
+        client = self.get_client(exchange)
+        client.download_data(pair=pair, start=start_unix, end=end_unix)
+
+        # get charts from client, reusing closed ticks stored on disk
+        client = self.get_client(exchange)
+        if self._chart_cache is not None:
+            return self._chart_cache.get_charts_multi(
+                client, exchange, pair, start_unix, end_unix, intervals,
+                as_arrays=as_arrays)
+        return client.get_charts_multi(pair, start_unix, end_unix, intervals,
+                                       as_arrays=as_arrays)
+
+    def get_bars(self,
+                 exchange,
+                 pair,
+                 start_unix,
+                 end_unix,
+                 bar_type='tick',
+                 threshold=1000,
+                 as_arrays=False):
+        """Get tick, volume or dollar bars from specified exchange and
+        currency pair.
+
+        Args:
+            exchange (str): Name of exchange.
+            pair (str): Name of currency pair.
+            start_unix (int): Start UNIX of trade data.
+            end_unit (int): End UNIX of trade data.
+            bar_type (str): 'tick', 'volume' or 'dollar'.
+            threshold (float): Amount of activity in each bar.
+            as_arrays (bool): Return numpy arrays instead of lists.
+
+        Returns:
+            Bar data built from trades in the range `start_unix` to `end_unix`
+            from the specified exchange and currency pair.
+        """
+        if exchange not in self._all_clients:
+            raise ValueError('Exchange {} not found'.format(exchange))
+        if pair not in self._all_pairs[exchange]:
+            raise ValueError('Currency pair {} not found in exchange {}'.format(
+                pair, exchange))
+
+        # download relevant data
+        client = self.get_client(exchange)
+        client.download_data(pair=pair, start=start_unix, end=end_unix)
+
+        # get bars from client
+        client = self.get_client(exchange)
+        return client.get_bars(pair, start_unix, end_unix, bar_type, threshold,
+                               as_arrays=as_arrays)
+
+    def get_charts_all(self,
+                       start_unix,
+                       end_unix,
+                       interval=900,
+                       n_proc=None,
+                       savedir='exchange_data\\chart_arrays'):
+        """Build chart data of every downloaded currency pair in a process
+        pool. Each worker saves the arrays of its pair to disk, which are
+        then memory-mapped instead of being copied back to this process.
+
+        Args:
+            start_unix (int): Start UNIX of chart data.
+            end_unit (int): End UNIX of chart data.
+            interval (int): Interval, in seconds.
+            n_proc (int, optional): Number of processes in process pool.
+            savedir (str): Directory of saved arrays.
+
+        Returns:
+            Dict keyed by exchange of dicts keyed by currency pair of chart
+            data, as read-only memory-mapped numpy arrays. Pairs without
+            downloaded trades are left out.
+        """
+        if not os.path.exists(savedir):
+            os.makedirs(savedir)
+
+        tasks = []
+        for ex_name in sorted(self._all_clients):
+            for pair in self._all_pairs[ex_name]:
+                tasks.append((self._all_clients[ex_name],
+                              self._client_kwargs(ex_name), ex_name, pair,
+                              start_unix, end_unix, interval, savedir,
+                              self._chart_cache is not None))
+
+        # execute concurrent ops, handing out one pair at a time since pairs
+        # differ widely in number of trades
+        all_charts = {ex_name: {} for ex_name in sorted(self._all_clients)}
+        with Pool(processes=n_proc) as pool:
+            for ex_name, pair, paths in pool.imap(_save_charts, tasks):
+                if paths is not None:
+                    all_charts[ex_name][pair] = {
+                        key: np.load(path, mmap_mode='r')
+                        for key, path in paths.items()}
+        return all_charts
 
     def download_all(self,
                      start_unix,
@@ -135,7 +358,7 @@ class DataManager:
         async_ops = []
         for ex_name in sorted(self._all_clients):
             for pair in self._all_pairs[ex_name]:
-                client = self._all_clients[ex_name]()
+                client = self.get_client(ex_name)
                 dl_op = getattr(client, 'download_data')
                 async_ops.append(tp.apply_async(
                     func=dl_op,
@@ -1,19 +1,189 @@
+import collections
 import csv
+import io
+import itertools
 import os
+import shutil
+import time
+import zlib
+
 import numpy
 
 
+class FixedPoint(collections.namedtuple('FixedPoint', ['step'])):
+    """Column type of decimal values stored as int64 multiples of `step`,
+    such as the tick size of prices or the lot size of amounts.
+    """
+
+    def _inverse(self):
+        """Return the integer inverse of `step`, or None if it has none.
+        """
+        inverse = round(1 / self.step)
+        if inverse > 0 and abs(inverse * self.step - 1) < 1e-12:
+            return inverse
+        return None
+
+    def _scale(self, values):
+        values = numpy.asarray(values, dtype=numpy.float64)
+        inverse = self._inverse()
+        if inverse is not None:
+            return values * inverse
+        return values / self.step
+
+    def to_units(self, values, fieldname=None):
+        """Convert decimal values to int64 multiples of `step`. Multiples
+        beyond float64 precision, such as microseconds of UNIX times, are
+        matched up to that precision.
+        """
+        scaled = self._scale(values)
+        units = numpy.round(scaled)
+        if not numpy.allclose(scaled, units, rtol=1e-15, atol=1e-6):
+            raise ValueError('Values of column {} are not multiples of '
+                             '{}'.format(fieldname, self.step))
+        return units.astype(numpy.int64)
+
+    def nearest_units(self, values):
+        """Convert values to the nearest int64 multiples of `step`.
+        """
+        return numpy.round(self._scale(values)).astype(numpy.int64)
+
+    def to_values(self, units):
+        """Convert multiples of `step` to decimal values. Dividing by the
+        inverse of a step like 0.01 gives the float closest to the decimal,
+        which multiplying by the step does not.
+        """
+        inverse = self._inverse()
+        if inverse is not None:
+            return units / inverse
+        return units * self.step
+
+
+# Column type of UNIX times of trades, stored as int64 microseconds so
+# sub-second trades keep their order and times are exact in every backend.
+TIME_DTYPE = FixedPoint(0.000001)
+
+
+def get_dataio(savedir, fieldnames, dtypes=None, storage='csv',
+               partition=None):
+    """Create a storage backend instance.
+
+    Args:
+        savedir (str): Directory of stored files.
+        fieldnames (list of str): Names of stored columns.
+        dtypes (dict, optional): Column types keyed by fieldname. Required by
+            binary backends. `FixedPoint` columns are returned as int64
+            multiples of their step when read as arrays.
+        storage (str): Name of storage backend in `STORAGE_BACKENDS`.
+        partition (str, optional): Split files into 'day' or 'month'
+            partitions by row time.
+
+    Returns:
+        An instance of the requested storage backend.
+    """
+    if storage not in STORAGE_BACKENDS:
+        raise ValueError('Storage backend {} not found'.format(storage))
+    dataio = STORAGE_BACKENDS[storage](savedir, fieldnames, dtypes)
+    if partition is not None:
+        dataio = PartitionedIO(dataio, partition)
+    return dataio
+
+
+def _range_indices(times, start, end):
+    """Find the slice of sorted `times` from the last time at or before
+    `start` up to the last time at or before `end`.
+
+    Returns:
+        A (start index, end index) tuple, end exclusive.
+    """
+    start_index = max(numpy.searchsorted(times, start, 'right') - 1, 0)
+    end_index = max(numpy.searchsorted(times, end, 'right'), start_index)
+    return int(start_index), int(end_index)
+
+
+def _concat_data(parts):
+    """Concatenate dicts of lists or dicts of numpy arrays column-wise.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    data = {}
+    for fieldname in parts[0]:
+        columns = [part[fieldname] for part in parts]
+        if isinstance(columns[0], numpy.ndarray):
+            data[fieldname] = numpy.concatenate(columns)
+        else:
+            data[fieldname] = [value for column in columns
+                               for value in column]
+    return data
+
+
+def _fsync_file(path):
+    """Sync a closed file to disk.
+    """
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+
+def _truncate_file(path, size):
+    """Truncate a file to `size` bytes if it is larger.
+    """
+    if os.path.exists(path) and os.path.getsize(path) > size:
+        with open(path, 'r+b') as f:
+            f.truncate(size)
+
+
+def _slice_data(data, start, end):
+    """Slice every column of a dict of lists or numpy arrays.
+    """
+    return {fieldname: column[start:end] for fieldname, column in data.items()}
+
+
+def rechunk(parts, chunk_rows):
+    """Regroup an iterable of row dicts into chunks of `chunk_rows` rows.
+    The last chunk may be shorter.
+    """
+    pending = []
+    n_pending = 0
+    for part in parts:
+        n_rows = len(part['time'])
+        if n_rows == 0:
+            continue
+        pending.append(part)
+        n_pending += n_rows
+        while n_pending >= chunk_rows:
+            data = _concat_data(pending)
+            yield _slice_data(data, 0, chunk_rows)
+            pending = [_slice_data(data, chunk_rows, None)]
+            n_pending -= chunk_rows
+    if n_pending > 0:
+        yield _concat_data(pending)
+
+
 class DataIO:
 
-    def __init__(self, savedir, fieldnames):
+    # Rows between entries of the sparse time index kept next to each file.
+    INDEX_STEP = 1000
+    # Rows parsed per batch when reading a range of a file.
+    READ_ROWS = 10000
+    INDEX_DTYPE = numpy.dtype([('time', 'float64'),
+                               ('row', 'int64'),
+                               ('offset', 'int64')])
+    # Columns of the journal written before each commit.
+    JOURNAL_FIELDNAMES = ['path', 'size', 'backup']
+
+    def __init__(self, savedir, fieldnames, dtypes=None):
         self._savedir = savedir
         self._fieldnames = fieldnames
+        self._dtypes = dtypes
         self._make_savedir()
 
     @property
     def fieldnames(self):
         return self._fieldnames
 
+    @property
+    def dtypes(self):
+        return self._dtypes
+
     def _make_savedir(self):
         """Create directory if it does not exist.
         """
@@ -35,6 +205,12 @@ class DataIO:
             os.remove(new_filepath)
         filepath = '{}\\{}.csv'.format(self._savedir, filename)
         os.rename(filepath, new_filepath)
+        for path, new_path in zip(self._sidecar_paths(filename),
+                                  self._sidecar_paths(new_filename)):
+            if os.path.exists(new_path):
+                os.remove(new_path)
+            if os.path.exists(path):
+                os.rename(path, new_path)
 
     def csv_newfile(self, filename):
         """Create a new file and write header.
@@ -45,6 +221,10 @@ class DataIO:
         with open('{}\\{}.csv'.format(self._savedir, filename), 'w', newline='') as f:
             w = csv.DictWriter(f, fieldnames=self.fieldnames)
             w.writeheader()
+        for path in self._sidecar_paths(filename):
+            if os.path.exists(path):
+                os.remove(path)
+        self._remove_journal(filename)
 
     def csv_check(self, filename, create_file=True):
         """Check if file is present. If file is not present, create a new file
@@ -73,34 +253,764 @@ class DataIO:
             filename (str): Name of file.
             data (dict or list of dict): Data to write to file.
         """
-        with open('{}\\{}.csv'.format(self._savedir, filename), 'a', newline='') as f:
+        with self.csv_writer(filename, fsync=False) as writer:
+            writer.append(data)
+
+    def csv_writer(self, filename, batch_rows=10000, batch_seconds=60,
+                   fsync=True):
+        """Open a buffered writer session that keeps the file open between
+        appends. Use as a context manager; buffered rows are committed when
+        the session closes.
+
+        Args:
+            filename (str): Name of file.
+            batch_rows (int): Number of buffered rows that triggers a commit.
+            batch_seconds (float): Seconds since the last commit that
+                trigger a commit.
+            fsync (bool): Sync file to disk on each commit.
+
+        Returns:
+            A `DataWriter` instance.
+        """
+        return DataWriter(self, filename, batch_rows, batch_seconds, fsync)
+
+    def _journal_path(self, filename):
+        return '{}\\{}.journal'.format(self._savedir, filename)
+
+    def _journal_files(self, filename, rows):
+        """Return the paths of files appended to and the paths of files
+        replaced when `rows` are committed to file.
+        """
+        return (['{}\\{}.csv'.format(self._savedir, filename),
+                 self._index_path(filename)],
+                [self._last_path(filename)])
+
+    def _begin_commit(self, filename, rows, fsync):
+        """Write a journal of the files a commit of `rows` modifies. Sizes of
+        appended files are recorded and replaced files are copied, so
+        `csv_recover` can undo a commit that did not complete.
+        """
+        appended, replaced = self._journal_files(filename, rows)
+        entries = []
+        for path in appended:
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            entries.append({'path': path, 'size': size, 'backup': ''})
+        for path in replaced:
+            backup = ''
+            if os.path.exists(path):
+                backup = path + '.bak'
+                shutil.copyfile(path, backup)
+                if fsync:
+                    _fsync_file(backup)
+            entries.append({'path': path, 'size': '', 'backup': backup})
+
+        journal_path = self._journal_path(filename)
+        with open(journal_path + '.tmp', 'w', newline='') as f:
+            w = csv.DictWriter(f, fieldnames=self.JOURNAL_FIELDNAMES)
+            w.writeheader()
+            w.writerows(entries)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(journal_path + '.tmp', journal_path)
+
+    def _remove_journal(self, filename):
+        """Complete a commit by removing its journal and file copies.
+        """
+        journal_path = self._journal_path(filename)
+        if not os.path.exists(journal_path):
+            return
+        with open(journal_path, 'r', newline='') as f:
+            entries = list(csv.DictReader(f))
+        os.remove(journal_path)
+        for entry in entries:
+            if entry['backup'] != '' and os.path.exists(entry['backup']):
+                os.remove(entry['backup'])
+
+    def csv_recover(self, filename):
+        """Undo a commit interrupted by a crash, then drop any torn rows at
+        the end of file. Called when a writer session opens, so an
+        interrupted download resumes from the last committed row.
+
+        Args:
+            filename (str): Name of file.
+        """
+        journal_path = self._journal_path(filename)
+        if os.path.exists(journal_path):
+            with open(journal_path, 'r', newline='') as f:
+                entries = list(csv.DictReader(f))
+            for entry in entries:
+                if entry['size'] != '':
+                    _truncate_file(entry['path'], int(entry['size']))
+                elif entry['backup'] != '':
+                    if os.path.exists(entry['backup']):
+                        os.replace(entry['backup'], entry['path'])
+                elif os.path.exists(entry['path']):
+                    os.remove(entry['path'])
+            os.remove(journal_path)
+        self._repair(filename)
+
+    def _repair(self, filename):
+        """Truncate a torn last line and drop index entries past it.
+        """
+        filepath = '{}\\{}.csv'.format(self._savedir, filename)
+        if not os.path.exists(filepath):
+            return
+        with open(filepath, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            end = size
+            while end > 0:
+                start = max(end - 4096, 0)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b'\n')
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+        _truncate_file(filepath, end)
+
+        index_path = self._index_path(filename)
+        if os.path.exists(index_path):
+            itemsize = self.INDEX_DTYPE.itemsize
+            index = numpy.fromfile(index_path, dtype=self.INDEX_DTYPE,
+                                   count=os.path.getsize(index_path) //
+                                   itemsize)
+            n_entries = numpy.searchsorted(index['offset'], end, 'left')
+            _truncate_file(index_path, n_entries * itemsize)
+
+    def _open_writer(self, filename):
+        f = open('{}\\{}.csv'.format(self._savedir, filename), 'a',
+                 newline='')
+        return f, csv.DictWriter(f, fieldnames=self.fieldnames)
+
+    def _write_rows(self, handle, rows):
+        handle[1].writerows(rows)
+
+    def _sync_writer(self, handle, fsync):
+        handle[0].flush()
+        if fsync:
+            os.fsync(handle[0].fileno())
+
+    def _close_writer(self, handle):
+        handle[0].close()
+
+    def _commit_rows(self, filename, rows):
+        """Update sidecar files after rows were written to file.
+        """
+        self._write_last(filename, rows[-1])
+        if 'time' in self.fieldnames:
+            self.csv_index(filename)
+
+    def _end_commit(self, filename, rows):
+        """Release files left unused by a commit of `rows`, once its journal
+        is removed and the commit can no longer be undone. Backends that
+        keep such files override this.
+        """
+        pass
+
+    def csv_get(self, filename, as_arrays=False):
+        """Fetch data stored in file.
+
+        Args:
+            filename (str): Name of file.
+            as_arrays (bool): Return columns as numpy arrays of `dtypes`.
+
+        Returns:
+            A dict of list, or a dict of numpy arrays if `as_arrays`.
+        """
+        with open('{}\\{}.csv'.format(self._savedir, filename), 'r', newline='') as f:
+            r = csv.reader(f)
+            fieldnames = next(r)
+            rows = [row for row in r if len(row) == len(fieldnames)]
+        return self._rows_to_data(fieldnames, rows, as_arrays)
+
+    def _index_path(self, filename):
+        return '{}\\{}.idx'.format(self._savedir, filename)
+
+    def _last_path(self, filename):
+        return '{}\\{}.last'.format(self._savedir, filename)
+
+    def _sidecar_paths(self, filename):
+        return [self._index_path(filename), self._last_path(filename)]
+
+    def _write_last(self, filename, row):
+        """Replace the sidecar file holding the last committed row.
+        """
+        last_path = self._last_path(filename)
+        with open(last_path + '.tmp', 'w', newline='') as f:
             w = csv.DictWriter(f, fieldnames=self.fieldnames)
-            if len(numpy.shape(data)) > 0:
-                for data_row in data:
-                    w.writerow(data_row)
+            w.writeheader()
+            w.writerow(row)
+        os.replace(last_path + '.tmp', last_path)
+
+    def csv_index(self, filename):
+        """Bring the sparse time index of a file up to date and return it.
+
+        The index holds the time, row number and byte offset of every
+        `INDEX_STEP`-th row. Only rows after the last index entry are read, so
+        keeping the index current after an append costs at most
+        `INDEX_STEP` rows plus the appended rows.
+
+        Args:
+            filename (str): Name of file.
+
+        Returns:
+            A numpy structured array of `INDEX_DTYPE`.
+        """
+        index_path = self._index_path(filename)
+        index = numpy.zeros(0, dtype=self.INDEX_DTYPE)
+        if os.path.exists(index_path):
+            index = numpy.fromfile(index_path, dtype=self.INDEX_DTYPE)
+
+        new_entries = []
+        with open('{}\\{}.csv'.format(self._savedir, filename), 'rb') as f:
+            header = f.readline()
+            fieldnames = next(csv.reader([header.decode()]))
+            time_index = fieldnames.index('time')
+            if len(index) > 0:
+                row, offset = int(index['row'][-1]), int(index['offset'][-1])
             else:
-                w.writerow(data)
+                row, offset = 0, len(header)
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # incomplete last row
+                if row % self.INDEX_STEP == 0 and (len(index) == 0 or
+                                                   row > index['row'][-1]):
+                    values = next(csv.reader([line.decode()]))
+                    new_entries.append(
+                        (float(values[time_index]), row, offset))
+                row += 1
+                offset += len(line)
+
+        if len(new_entries) > 0:
+            new_entries = numpy.array(new_entries, dtype=self.INDEX_DTYPE)
+            with open(index_path, 'ab') as f:
+                new_entries.tofile(f)
+            index = numpy.concatenate([index, new_entries])
+        return index
+
+    def csv_get_range(self, filename, start, end, as_arrays=False):
+        """Fetch rows from the last row at or before `start` up to the last
+        row at or before `end`. Rows are read from the nearest time index
+        entry, so only rows overlapping the range are parsed.
+
+        Args:
+            filename (str): Name of file.
+            start (float): Start UNIX of rows to fetch.
+            end (float): End UNIX of rows to fetch.
+            as_arrays (bool): Return columns as numpy arrays of `dtypes`.
+
+        Returns:
+            A dict of list, or a dict of numpy arrays if `as_arrays`.
+        """
+        # a single chunk holds all rows of the range
+        return next(self._iter_range(filename, start, end, float('inf'),
+                                     as_arrays))
+
+    def csv_iter_range(self, filename, start, end, chunk_rows=100000,
+                       as_arrays=False):
+        """Iterate over the rows of `csv_get_range` in chunks. Rows are read
+        from disk as the chunks are consumed.
+
+        Args:
+            filename (str): Name of file.
+            start (float): Start UNIX of rows to fetch.
+            end (float): End UNIX of rows to fetch.
+            chunk_rows (int): Number of rows in each chunk. The last chunk
+                may be shorter.
+            as_arrays (bool): Yield columns as numpy arrays.
+
+        Returns:
+            A generator of chunks in the format of `csv_get_range`.
+        """
+        if chunk_rows < 1:
+            raise ValueError('chunk_rows must be positive')
+        return rechunk(self._iter_range(filename, start, end, chunk_rows,
+                                         as_arrays), chunk_rows)
+
+    def _iter_range(self, filename, start, end, chunk_rows, as_arrays):
+        index = self.csv_index(filename)
+        with open('{}\\{}.csv'.format(self._savedir, filename), 'rb') as f:
+            header = f.readline()
+            fieldnames = next(csv.reader([header.decode()]))
+            time_index = fieldnames.index('time')
+
+            # seek to last index entry strictly before start
+            entry = numpy.searchsorted(index['time'], start, side='left') - 1
+            if len(index) > 0:
+                f.seek(index['offset'][max(entry, 0)])
+
+            # parse the time column of each batch of rows in a single call
+            reader = csv.reader(io.TextIOWrapper(f, newline=''))
+            batch_rows = min(chunk_rows, self.READ_ROWS)
+            rows = []
+            passed_start = False
+            while True:
+                batch = list(itertools.islice(reader, batch_rows))
+                complete = [len(row) == len(fieldnames) for row in batch]
+                if not all(complete):
+                    batch = batch[:complete.index(False)]  # incomplete row
+                times = numpy.array([row[time_index] for row in batch],
+                                    dtype=numpy.float64)
+                before_end = int(numpy.searchsorted(times, end, 'right'))
+                after_start = min(int(numpy.searchsorted(times, start,
+                                                         'right')),
+                                  before_end)
+                if after_start > 0:
+                    rows = batch[after_start - 1:before_end]
+                else:
+                    rows.extend(batch[:before_end])
+                passed_start = passed_start or after_start < before_end
+                if before_end < len(batch) or len(batch) < batch_rows:
+                    break
+                if passed_start and len(rows) >= chunk_rows:
+                    yield self._rows_to_data(fieldnames, rows, as_arrays)
+                    rows = []
+        yield self._rows_to_data(fieldnames, rows, as_arrays)
+
+    def _rows_to_data(self, fieldnames, rows, as_arrays):
+        """Transpose parsed CSV rows into a dict of columns.
+        """
+        columns = list(zip(*rows))
+        if len(columns) == 0:
+            columns = [() for fieldname in fieldnames]
+        data = {fieldname: list(column)
+                for fieldname, column in zip(fieldnames, columns)}
+        if as_arrays:
+            return self._to_arrays(data)
+        return data
+
+    def _empty_data(self, as_arrays):
+        """Return data without rows, of the types of fetched data.
+        """
+        return self._rows_to_data(self.fieldnames, [], as_arrays)
+
+    def _to_arrays(self, data):
+        """Parse a dict of columns of strings into typed numpy arrays. Each
+        numeric column is parsed by numpy in a single call.
+        """
+        arrays = {}
+        for fieldname in data:
+            dtype = None
+            if self.dtypes is not None and fieldname in self.dtypes:
+                dtype = self.dtypes[fieldname]
+            if isinstance(dtype, FixedPoint):
+                arrays[fieldname] = dtype.to_units(data[fieldname], fieldname)
+            elif dtype is None or isinstance(dtype, tuple) or \
+                    numpy.dtype(dtype).kind == 'S':
+                arrays[fieldname] = numpy.array(data[fieldname], dtype=str)
+            else:
+                arrays[fieldname] = numpy.array(data[fieldname], dtype=dtype)
+        return arrays
+
+    def csv_get_last(self, filename, block_size=4096):
+        """Fetch the last row in file. The file is read backwards from its end
+        until the last complete line is found, so the cost does not depend
+        on file size. Falls back to the sidecar file written by `csv_append`
+        if the last line cannot be parsed.
+
+        Args:
+            filename (str): Name of file.
+            block_size (int): Number of bytes read per backward step.
+
+        Returns:
+            A dict representing the last row stored in file.
+        """
+        with open('{}\\{}.csv'.format(self._savedir, filename), 'rb') as f:
+            header = f.readline()
+            fieldnames = next(csv.reader([header.decode()]))
+            data_start = f.tell()
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+
+            # read blocks backwards until a complete line is buffered
+            tail = b''
+            while position > data_start:
+                read_size = min(block_size, position - data_start)
+                position -= read_size
+                f.seek(position)
+                tail = f.read(read_size) + tail
+                lines = tail.split(b'\n')
+                # lines[0] may be partial, lines[-1] is an incomplete row
+                if len(lines) > 2 or (position == data_start and
+                                      len(lines) > 1):
+                    break
+
+        lines = tail.split(b'\n')[:-1]
+        if len(lines) == 0:
+            return None
+        values = next(csv.reader([lines[-1].decode()]), [])
+        if len(values) == len(fieldnames):
+            return dict(zip(fieldnames, values))
+
+        # fall back to last committed row
+        try:
+            with open(self._last_path(filename), 'r', newline='') as f:
+                return next(csv.DictReader(f), None)
+        except FileNotFoundError:
+            return None
+
+
+class DataWriter:
+    """Writer session over a file of a storage backend. Rows are buffered in
+    memory and written through a single open handle whenever `batch_rows`
+    rows are buffered or `batch_seconds` passed since the last commit.
+    """
+
+    def __init__(self, dataio, filename, batch_rows, batch_seconds, fsync):
+        self._dataio = dataio
+        self._filename = filename
+        self._batch_rows = batch_rows
+        self._batch_seconds = batch_seconds
+        self._fsync = fsync
+        self._rows = []
+        self._last_commit = time.time()
+        dataio.csv_recover(filename)
+        self._handle = dataio._open_writer(filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def append(self, data):
+        """Buffer a dict or a row of dicts, committing if a threshold is met.
+
+        Args:
+            data (dict or list of dict): Data to write to file.
+        """
+        if len(numpy.shape(data)) > 0:
+            self._rows.extend(data)
+        else:
+            self._rows.append(data)
+        if (len(self._rows) >= self._batch_rows or
+                time.time() - self._last_commit >= self._batch_seconds):
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows to file and sync them to disk. The rows are
+        committed as a whole: a journal written beforehand lets
+        `csv_recover` undo the write if it is interrupted. If the write
+        fails, it is undone, the session is closed and the error is raised.
+        """
+        if self._handle is None:
+            raise ValueError('Writer of {} is closed'.format(self._filename))
+        if len(self._rows) > 0:
+            self._dataio._begin_commit(self._filename, self._rows,
+                                       self._fsync)
+            try:
+                self._dataio._write_rows(self._handle, self._rows)
+                self._dataio._sync_writer(self._handle, self._fsync)
+                self._dataio._commit_rows(self._filename, self._rows)
+            except BaseException:
+                self._rollback()
+                raise
+            self._dataio._remove_journal(self._filename)
+            self._dataio._end_commit(self._filename, self._rows)
+            self._rows = []
+        self._last_commit = time.time()
+
+    def _rollback(self):
+        """Close the file and undo the commit in progress, dropping its rows.
+        """
+        handle, self._handle = self._handle, None
+        self._rows = []
+        try:
+            self._dataio._close_writer(handle)
+        except Exception:
+            # rows still buffered by the handle are truncated below
+            pass
+        self._dataio.csv_recover(self._filename)
+
+    def close(self):
+        """Commit buffered rows and close the file.
+        """
+        if self._handle is not None:
+            try:
+                self.flush()
+            finally:
+                if self._handle is not None:
+                    self._dataio._close_writer(self._handle)
+                    self._handle = None
+
+
+class ColumnIO(DataIO):
+    """Stores each column as a typed, fixed-width binary array in its own
+    file. Offers the same interface as `DataIO`.
+
+    Column types are given as numpy dtype strings (e.g. 'float64', 'int64',
+    'S32'), as a tuple of category strings, which are stored as int8 codes,
+    or as a `FixedPoint`, stored as int64 multiples of its step. The steps
+    of `FixedPoint` columns are recorded in a `<filename>.schema` file, so a
+    file is never read with steps other than those it was written with.
+    """
+
+    def __init__(self, savedir, fieldnames, dtypes):
+        if dtypes is None:
+            raise ValueError('Column storage requires dtypes')
+        super().__init__(savedir, fieldnames, dtypes)
+
+    def _column_path(self, filename, fieldname):
+        return '{}\\{}.{}.bin'.format(self._savedir, filename, fieldname)
+
+    def _schema_path(self, filename):
+        return '{}\\{}.schema'.format(self._savedir, filename)
+
+    def _fixed_steps(self):
+        return {fieldname: dtype.step for fieldname, dtype in
+                self.dtypes.items() if isinstance(dtype, FixedPoint)}
+
+    def _write_schema(self, filename):
+        """Record the steps of `FixedPoint` columns of a new file.
+        """
+        schema_path = self._schema_path(filename)
+        steps = self._fixed_steps()
+        if len(steps) == 0:
+            if os.path.exists(schema_path):
+                os.remove(schema_path)
+            return
+        with open(schema_path, 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(['fieldname', 'step'])
+            for fieldname, step in steps.items():
+                w.writerow([fieldname, repr(float(step))])
+
+    def _check_schema(self, filename):
+        """Raise if a file was written with other `FixedPoint` steps.
+        """
+        stored = {}
+        schema_path = self._schema_path(filename)
+        if os.path.exists(schema_path):
+            with open(schema_path, 'r', newline='') as f:
+                for row in csv.DictReader(f):
+                    stored[row['fieldname']] = float(row['step'])
+        steps = {fieldname: float(step)
+                 for fieldname, step in self._fixed_steps().items()}
+        if stored != steps:
+            raise ValueError('Fixed-point steps of {} are {}, not {}'.format(
+                filename, stored, steps))
+
+    def _rename_schema(self, filename, new_filename):
+        if os.path.exists(self._schema_path(filename)):
+            os.replace(self._schema_path(filename),
+                       self._schema_path(new_filename))
+
+    def _storage_dtype(self, fieldname):
+        dtype = self.dtypes[fieldname]
+        if isinstance(dtype, FixedPoint):
+            return numpy.dtype(numpy.int64)
+        if isinstance(dtype, tuple):
+            return numpy.dtype(numpy.int8)
+        return numpy.dtype(dtype)
+
+    def _encode(self, fieldname, values):
+        """Convert a list of values into a typed array for storage.
+        """
+        dtype = self.dtypes[fieldname]
+        if isinstance(dtype, FixedPoint):
+            return dtype.to_units(values, fieldname)
+        if isinstance(dtype, tuple):
+            codes = {category: i for i, category in enumerate(dtype)}
+            try:
+                return numpy.array([codes[str(v)] for v in values],
+                                   dtype=numpy.int8)
+            except KeyError as e:
+                raise ValueError('Unknown category {} in column {}'.format(
+                    e, fieldname))
+        if numpy.dtype(dtype).kind == 'S':
+            values = [str(v) for v in values]
+        return numpy.asarray(values, dtype=dtype)
+
+    def _decode(self, fieldname, array, as_arrays=True):
+        """Convert a stored array into values returned to the caller.
+        `FixedPoint` columns stay int64 multiples of their step if
+        `as_arrays` is set and are converted to floats otherwise.
+        """
+        dtype = self.dtypes[fieldname]
+        if isinstance(dtype, FixedPoint):
+            if as_arrays:
+                return array
+            return dtype.to_values(array)
+        if isinstance(dtype, tuple):
+            return numpy.asarray(dtype)[array]
+        if array.dtype.kind == 'S':
+            return array.astype(str)
+        return array
+
+    def _time_key(self, unix):
+        """Convert a UNIX time into units of the stored time column.
+        """
+        dtype = self.dtypes['time']
+        if isinstance(dtype, FixedPoint) and numpy.isfinite(unix):
+            return float(dtype.nearest_units(unix))
+        return unix
+
+    def _empty_data(self, as_arrays):
+        return {fieldname: self._decode(
+            fieldname, numpy.empty(0, dtype=self._storage_dtype(fieldname)),
+            as_arrays) for fieldname in self.fieldnames}
+
+    def _n_rows(self, filename):
+        fieldname = self.fieldnames[0]
+        size = os.path.getsize(self._column_path(filename, fieldname))
+        return size // self._storage_dtype(fieldname).itemsize
+
+    def _read_column(self, filename, fieldname, start=0, count=-1):
+        """Read stored values of a column without decoding them.
+        """
+        dtype = self._storage_dtype(fieldname)
+        return numpy.fromfile(self._column_path(filename, fieldname),
+                              dtype=dtype, count=count,
+                              offset=start * dtype.itemsize)
+
+    def csv_rename(self, filename, new_filename):
+        for fieldname in self.fieldnames:
+            new_filepath = self._column_path(new_filename, fieldname)
+            if os.path.exists(new_filepath):
+                os.remove(new_filepath)
+            os.rename(self._column_path(filename, fieldname), new_filepath)
+        self._rename_schema(filename, new_filename)
+
+    def _new_columns(self, filename):
+        for fieldname in self.fieldnames:
+            open(self._column_path(filename, fieldname), 'wb').close()
+
+    def csv_newfile(self, filename):
+        self._new_columns(filename)
+        self._write_schema(filename)
+        self._remove_journal(filename)
+
+    def csv_check(self, filename, create_file=True):
+        if os.path.exists(self._column_path(filename, self.fieldnames[0])):
+            self._check_schema(filename)
+            return True
+        if create_file:
+            self.csv_newfile(filename)
+        return False
+
+    def _journal_files(self, filename, rows):
+        return ([self._column_path(filename, fieldname)
+                 for fieldname in self.fieldnames], [])
+
+    def _repair(self, filename):
+        """Truncate columns to the number of rows written to every column.
+        """
+        paths = [self._column_path(filename, fieldname)
+                 for fieldname in self.fieldnames]
+        if not all(os.path.exists(path) for path in paths):
+            return
+        n_rows = min(os.path.getsize(path) //
+                     self._storage_dtype(fieldname).itemsize
+                     for path, fieldname in zip(paths, self.fieldnames))
+        for path, fieldname in zip(paths, self.fieldnames):
+            _truncate_file(path,
+                           n_rows * self._storage_dtype(fieldname).itemsize)
 
-    def csv_get(self, filename):
+    def _open_writer(self, filename):
+        return {fieldname: open(self._column_path(filename, fieldname), 'ab')
+                for fieldname in self.fieldnames}
+
+    def _write_rows(self, handle, rows):
+        for fieldname in self.fieldnames:
+            array = self._encode(fieldname, [row[fieldname] for row in rows])
+            array.tofile(handle[fieldname])
+
+    def _sync_writer(self, handle, fsync):
+        for f in handle.values():
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+
+    def _close_writer(self, handle):
+        for f in handle.values():
+            f.close()
+
+    def _commit_rows(self, filename, rows):
+        pass
+
+    def csv_get(self, filename, as_arrays=False):
         """Fetch data stored in file.
 
         Args:
             filename (str): Name of file.
+            as_arrays (bool): Return `FixedPoint` columns as int64 multiples
+                of their step. Binary columns are always returned as numpy
+                arrays.
 
         Returns:
-            A dict of list.
+            A dict of numpy arrays.
         """
-        with open('{}\\{}.csv'.format(self._savedir, filename), 'r', newline='') as f:
-            r = csv.DictReader(f)
-            fieldnames = r.fieldnames
-            data = {fieldname: [] for fieldname in fieldnames}
-            for row in r:
-                for fieldname in row:
-                    data[fieldname].append(row[fieldname])
+        data = {}
+        for fieldname in self.fieldnames:
+            array = self._read_column(filename, fieldname)
+            data[fieldname] = self._decode(fieldname, array, as_arrays)
+        return data
+
+    def csv_index(self, filename):
+        """Column storage is indexed by its sorted time column.
+        """
+        return None
+
+    def _map_column(self, filename, fieldname):
+        """Memory-map a stored column read-only.
+        """
+        if self._n_rows(filename) == 0:
+            return self._read_column(filename, fieldname)
+        return numpy.memmap(self._column_path(filename, fieldname),
+                            dtype=self._storage_dtype(fieldname), mode='r')
+
+    def csv_get_range(self, filename, start, end, as_arrays=False):
+        """Fetch rows from the last row at or before `start` up to the last
+        row at or before `end`, using binary search on the time column.
+
+        Args:
+            filename (str): Name of file.
+            start (float): Start UNIX of rows to fetch.
+            end (float): End UNIX of rows to fetch.
+            as_arrays (bool): Return numeric columns as views of memory-mapped
+                files instead of copies. Processes mapping the same file
+                share its pages in the OS page cache. Category and string
+                columns are still decoded into new arrays.
+
+        Returns:
+            A dict of numpy arrays.
+        """
+        times = self._map_column(filename, 'time')
+        start_index, end_index = _range_indices(
+            times, self._time_key(start), self._time_key(end))
+
+        data = {}
+        for fieldname in self.fieldnames:
+            if as_arrays:
+                array = self._map_column(filename, fieldname)
+                array = array[start_index:end_index]
+            else:
+                array = self._read_column(filename, fieldname, start_index,
+                                          end_index - start_index)
+            data[fieldname] = self._decode(fieldname, array, as_arrays)
         return data
 
+    def _iter_range(self, filename, start, end, chunk_rows, as_arrays):
+        times = self._map_column(filename, 'time')
+        start_index, end_index = _range_indices(
+            times, self._time_key(start), self._time_key(end))
+        for chunk_start in range(start_index, end_index, chunk_rows):
+            chunk_end = min(chunk_start + chunk_rows, end_index)
+            data = {}
+            for fieldname in self.fieldnames:
+                if as_arrays:
+                    array = self._map_column(filename, fieldname)
+                    array = array[chunk_start:chunk_end]
+                else:
+                    array = self._read_column(filename, fieldname, chunk_start,
+                                              chunk_end - chunk_start)
+                data[fieldname] = self._decode(fieldname, array, as_arrays)
+            yield data
+
     def csv_get_last(self, filename):
-        """Fetch the last row in file.
+        """Fetch the last row in file without reading the preceding rows.
 
         Args:
             filename (str): Name of file.
@@ -108,9 +1018,582 @@ class DataIO:
         Returns:
             A dict representing the last row stored in file.
         """
-        with open('{}\\{}.csv'.format(self._savedir, filename), 'r', newline='') as f:
-            r = csv.DictReader(f)
-            last_row = None
-            for row in r:
-                last_row = row
+        n_rows = self._n_rows(filename)
+        if n_rows == 0:
+            return None
+        last_row = {}
+        for fieldname in self.fieldnames:
+            array = self._read_column(filename, fieldname, n_rows - 1, 1)
+            last_row[fieldname] = self._decode(fieldname, array, False)[0].item()
         return last_row
+
+
+class BlockIO(ColumnIO):
+    """Stores rows in blocks of `BLOCK_ROWS` rows, each compressed on its
+    own. A block index records the time range, row count and position of
+    every block, so range reads only decompress blocks in range. Rows of an
+    unfilled block are kept uncompressed as column files of a tail until the
+    block is full. There are two tails, `<filename>.tail0` and
+    `<filename>.tail1`; sealing blocks writes the remaining rows to the
+    unused tail, which the new block index entries then mark as current.
+    Tail rows are therefore never rewritten in place.
+
+    Within a block, integer columns are stored as differences of
+    consecutive values and float columns as the XOR of consecutive bit
+    patterns, both exactly reversible. Each column is then byte-shuffled,
+    grouping bytes of equal significance, before compression.
+    """
+
+    BLOCK_ROWS = 8192
+    COMPRESSION_LEVEL = 6
+    BLOCK_INDEX_DTYPE = numpy.dtype([('min_time', 'float64'),
+                                     ('max_time', 'float64'),
+                                     ('n_rows', 'int64'),
+                                     ('offset', 'int64'),
+                                     ('length', 'int64'),
+                                     ('tail_slot', 'int64')])
+
+    def _block_path(self, filename):
+        return '{}\\{}.blk'.format(self._savedir, filename)
+
+    def _block_index_path(self, filename):
+        return '{}\\{}.blkidx'.format(self._savedir, filename)
+
+    def _tail_slot(self, filename):
+        """Return the tail marked as current by the last block index entry.
+        """
+        index_path = self._block_index_path(filename)
+        if not os.path.exists(index_path):
+            return 0
+        itemsize = self.BLOCK_INDEX_DTYPE.itemsize
+        n_entries = os.path.getsize(index_path) // itemsize
+        if n_entries == 0:
+            return 0
+        entry = numpy.fromfile(index_path, dtype=self.BLOCK_INDEX_DTYPE,
+                               count=1, offset=(n_entries - 1) * itemsize)
+        return int(entry['tail_slot'][0])
+
+    def _tail_name(self, filename, slot=None):
+        if slot is None:
+            slot = self._tail_slot(filename)
+        return '{}.tail{}'.format(filename, slot)
+
+    def _block_index(self, filename):
+        return numpy.fromfile(self._block_index_path(filename),
+                              dtype=self.BLOCK_INDEX_DTYPE)
+
+    def _delta_encode(self, array):
+        if array.dtype.kind == 'i' and array.dtype.itemsize == 8:
+            return numpy.diff(array, prepend=array.dtype.type(0))
+        if array.dtype.kind == 'f' and array.dtype.itemsize == 8:
+            bits = array.view(numpy.uint64).copy()
+            bits[1:] ^= bits[:-1].copy()
+            return bits.view(array.dtype)
+        return array
+
+    def _delta_decode(self, array):
+        if array.dtype.kind == 'i' and array.dtype.itemsize == 8:
+            return numpy.cumsum(array)
+        if array.dtype.kind == 'f' and array.dtype.itemsize == 8:
+            bits = numpy.bitwise_xor.accumulate(array.view(numpy.uint64))
+            return bits.view(array.dtype)
+        return array
+
+    def _compress_block(self, columns):
+        """Shuffle and compress a dict of stored arrays into a block.
+        """
+        payload = []
+        for fieldname in self.fieldnames:
+            array = self._delta_encode(columns[fieldname])
+            shuffled = array.view(numpy.uint8).reshape(
+                len(array), array.dtype.itemsize).T
+            payload.append(shuffled.tobytes())
+        return zlib.compress(b''.join(payload), self.COMPRESSION_LEVEL)
+
+    def _decompress_block(self, block, n_rows):
+        """Decompress a block into a dict of stored arrays.
+        """
+        payload = zlib.decompress(block)
+        columns = {}
+        position = 0
+        for fieldname in self.fieldnames:
+            dtype = self._storage_dtype(fieldname)
+            size = n_rows * dtype.itemsize
+            shuffled = numpy.frombuffer(payload, dtype=numpy.uint8,
+                                        count=size, offset=position)
+            array = shuffled.reshape(
+                dtype.itemsize, n_rows).T.copy().view(dtype).reshape(-1)
+            columns[fieldname] = self._delta_decode(array)
+            position += size
+        return columns
+
+    def _read_blocks(self, filename, entries):
+        """Read and decompress blocks of the given block index entries.
+        """
+        parts = []
+        with open(self._block_path(filename), 'rb') as f:
+            for entry in entries:
+                f.seek(entry['offset'])
+                parts.append(self._decompress_block(f.read(entry['length']),
+                                                    entry['n_rows']))
+        return parts
+
+    def _read_tail(self, filename):
+        tail_name = self._tail_name(filename)
+        return {fieldname: self._read_column(tail_name, fieldname)
+                for fieldname in self.fieldnames}
+
+    def csv_rename(self, filename, new_filename):
+        for slot in (0, 1):
+            super().csv_rename(self._tail_name(filename, slot),
+                               self._tail_name(new_filename, slot))
+        os.replace(self._block_path(filename), self._block_path(new_filename))
+        os.replace(self._block_index_path(filename),
+                   self._block_index_path(new_filename))
+        self._rename_schema(filename, new_filename)
+
+    def csv_newfile(self, filename):
+        for slot in (0, 1):
+            self._new_columns(self._tail_name(filename, slot))
+        open(self._block_path(filename), 'wb').close()
+        open(self._block_index_path(filename), 'wb').close()
+        self._write_schema(filename)
+        self._remove_journal(filename)
+
+    def csv_check(self, filename, create_file=True):
+        if os.path.exists(self._block_index_path(filename)):
+            self._check_schema(filename)
+            return True
+        if create_file:
+            self.csv_newfile(filename)
+        return False
+
+    def _journal_files(self, filename, rows):
+        tail_name = self._tail_name(filename)
+        return ([self._block_path(filename),
+                 self._block_index_path(filename)] +
+                [self._column_path(tail_name, fieldname)
+                 for fieldname in self.fieldnames], [])
+
+    def _repair(self, filename):
+        """Drop a torn block index entry and block, then torn tail rows.
+        """
+        index_path = self._block_index_path(filename)
+        if not os.path.exists(index_path):
+            return
+        itemsize = self.BLOCK_INDEX_DTYPE.itemsize
+        _truncate_file(index_path,
+                       os.path.getsize(index_path) // itemsize * itemsize)
+        index = self._block_index(filename)
+        if len(index) > 0:
+            _truncate_file(self._block_path(filename),
+                           int(index['offset'][-1] + index['length'][-1]))
+        else:
+            _truncate_file(self._block_path(filename), 0)
+        super()._repair(self._tail_name(filename))
+        self._clear_unused_tail(filename)
+
+    def _clear_unused_tail(self, filename):
+        """Empty the tail that is not current. Its rows were moved to blocks
+        and the current tail by a completed commit, so it is only needed
+        again when the next block is sealed.
+        """
+        unused_name = self._tail_name(filename,
+                                      1 - self._tail_slot(filename))
+        for fieldname in self.fieldnames:
+            _truncate_file(self._column_path(unused_name, fieldname), 0)
+
+    def _open_writer(self, filename):
+        slot = self._tail_slot(filename)
+        return {'filename': filename,
+                'slot': slot,
+                'files': super()._open_writer(self._tail_name(filename, slot))}
+
+    def _write_rows(self, handle, rows):
+        # follow the tail made current by blocks sealed since the last write
+        slot = self._tail_slot(handle['filename'])
+        if slot != handle['slot']:
+            super()._close_writer(handle['files'])
+            handle['files'] = super()._open_writer(
+                self._tail_name(handle['filename'], slot))
+            handle['slot'] = slot
+        super()._write_rows(handle['files'], rows)
+
+    def _sync_writer(self, handle, fsync):
+        super()._sync_writer(handle['files'], fsync)
+
+    def _close_writer(self, handle):
+        super()._close_writer(handle['files'])
+
+    def _commit_rows(self, filename, rows):
+        """Compress full blocks out of the tail.
+        """
+        slot = self._tail_slot(filename)
+        tail_name = self._tail_name(filename, slot)
+        n_rows = self._n_rows(tail_name)
+        n_blocks = n_rows // self.BLOCK_ROWS
+        if n_blocks == 0:
+            return
+        tail = self._read_tail(filename)
+
+        # rows of the unfilled block move to the unused tail, which becomes
+        # current once the block index entries are written
+        new_slot = 1 - slot
+        new_tail_name = self._tail_name(filename, new_slot)
+        for fieldname in self.fieldnames:
+            with open(self._column_path(new_tail_name, fieldname), 'wb') as f:
+                tail[fieldname][n_blocks * self.BLOCK_ROWS:].tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+
+        entries = numpy.zeros(n_blocks, dtype=self.BLOCK_INDEX_DTYPE)
+        with open(self._block_path(filename), 'ab') as f:
+            f.seek(0, os.SEEK_END)
+            for i in range(n_blocks):
+                block_rows = slice(i * self.BLOCK_ROWS,
+                                   (i + 1) * self.BLOCK_ROWS)
+                block = self._compress_block(
+                    {fieldname: tail[fieldname][block_rows]
+                     for fieldname in self.fieldnames})
+                entries[i] = (tail['time'][block_rows.start],
+                              tail['time'][block_rows.stop - 1],
+                              self.BLOCK_ROWS, f.tell(), len(block), new_slot)
+                f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self._block_index_path(filename), 'ab') as f:
+            entries.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _end_commit(self, filename, rows):
+        # the old tail is emptied only now, as undoing the commit would make
+        # it current again
+        self._clear_unused_tail(filename)
+
+    def csv_get(self, filename, as_arrays=False):
+        """Fetch data stored in file.
+
+        Args:
+            filename (str): Name of file.
+            as_arrays (bool): Return `FixedPoint` columns as int64 multiples
+                of their step. Binary columns are always returned as numpy
+                arrays.
+
+        Returns:
+            A dict of numpy arrays.
+        """
+        parts = self._read_blocks(filename, self._block_index(filename))
+        parts.append(self._read_tail(filename))
+        columns = _concat_data(parts)
+        return {fieldname: self._decode(fieldname, columns[fieldname],
+                                        as_arrays)
+                for fieldname in self.fieldnames}
+
+    def csv_get_range(self, filename, start, end, as_arrays=False):
+        """Fetch rows from the last row at or before `start` up to the last
+        row at or before `end`, decompressing only blocks in that range.
+
+        Args:
+            filename (str): Name of file.
+            start (float): Start UNIX of rows to fetch.
+            end (float): End UNIX of rows to fetch.
+            as_arrays (bool): Return `FixedPoint` columns as int64 multiples
+                of their step. Decompressed rows are always returned as
+                numpy arrays.
+
+        Returns:
+            A dict of numpy arrays.
+        """
+        index = self._block_index(filename)
+        tail = self._read_tail(filename)
+        start, end = self._time_key(start), self._time_key(end)
+
+        # the block holding the last row at or before start comes first
+        first = max(numpy.searchsorted(index['min_time'], start, 'right') - 1,
+                    0)
+        last = numpy.searchsorted(index['min_time'], end, 'right')
+        parts = self._read_blocks(filename, index[first:last])
+        parts.append(tail)
+        columns = _concat_data(parts)
+
+        start_index, end_index = _range_indices(columns['time'], start, end)
+        return {fieldname: self._decode(
+            fieldname, columns[fieldname][start_index:end_index], as_arrays)
+            for fieldname in self.fieldnames}
+
+    def _iter_range(self, filename, start, end, chunk_rows, as_arrays):
+        index = self._block_index(filename)
+        tail = self._read_tail(filename)
+        start, end = self._time_key(start), self._time_key(end)
+
+        # the tail follows the blocks and may hold the row at or before start
+        min_times = numpy.concatenate([index['min_time'], tail['time'][:1]])
+        first = max(numpy.searchsorted(min_times, start, 'right') - 1, 0)
+        last = numpy.searchsorted(min_times, end, 'right')
+        for position in range(first, last):
+            if position < len(index):
+                columns = self._read_blocks(
+                    filename, index[position:position + 1])[0]
+            else:
+                columns = tail
+            start_index, end_index = _range_indices(columns['time'], start,
+                                                    end)
+            yield {fieldname: self._decode(
+                fieldname, columns[fieldname][start_index:end_index],
+                as_arrays)
+                for fieldname in self.fieldnames}
+
+    def csv_get_last(self, filename):
+        """Fetch the last row in file, decompressing at most one block.
+
+        Args:
+            filename (str): Name of file.
+
+        Returns:
+            A dict representing the last row stored in file.
+        """
+        tail_name = self._tail_name(filename)
+        if self._n_rows(tail_name) > 0:
+            return super().csv_get_last(tail_name)
+        index = self._block_index(filename)
+        if len(index) == 0:
+            return None
+        columns = self._read_blocks(filename, index[-1:])[0]
+        return {fieldname: self._decode(
+            fieldname, columns[fieldname][-1:], False)[0].item()
+            for fieldname in self.fieldnames}
+
+
+class PartitionedIO(DataIO):
+    """Splits each file of another storage backend into daily or monthly
+    partitions by row time. A manifest per file records the time range and
+    row count of every partition, so range reads only open partitions that
+    intersect the requested range. Partitions are ordinary files of the
+    wrapped backend named `<filename>.<partition>`.
+    """
+
+    MANIFEST_FIELDNAMES = ['partition', 'min_time', 'max_time', 'n_rows']
+    PARTITION_FORMATS = {
+        'day': '%Y-%m-%d',
+        'month': '%Y-%m',
+    }
+
+    def __init__(self, dataio, partition):
+        if partition not in self.PARTITION_FORMATS:
+            raise ValueError('Partition {} not found'.format(partition))
+        super().__init__(dataio._savedir, dataio.fieldnames, dataio.dtypes)
+        self._dataio = dataio
+        self._partition = partition
+
+    def _manifest_path(self, filename):
+        return '{}\\{}.manifest'.format(self._savedir, filename)
+
+    def _partition_name(self, filename, key):
+        return '{}.{}'.format(filename, key)
+
+    def _partition_key(self, unix):
+        return time.strftime(self.PARTITION_FORMATS[self._partition],
+                             time.gmtime(unix))
+
+    def _split_rows(self, rows):
+        """Split time-ordered rows into runs sharing a partition key.
+
+        Returns:
+            A list of (key, rows) tuples.
+        """
+        runs = []
+        day = None
+        for row in rows:
+            unix = float(row['time'])
+            if unix // 86400 != day:
+                day = unix // 86400
+                key = self._partition_key(unix)
+                if len(runs) == 0 or runs[-1][0] != key:
+                    runs.append((key, []))
+            runs[-1][1].append(row)
+        return runs
+
+    def csv_manifest(self, filename):
+        """Fetch the manifest of a partitioned file.
+
+        Args:
+            filename (str): Name of file.
+
+        Returns:
+            A list of dict, one per partition, in the order of time.
+        """
+        with open(self._manifest_path(filename), 'r', newline='') as f:
+            manifest = []
+            for row in csv.DictReader(f):
+                manifest.append({'partition': row['partition'],
+                                 'min_time': float(row['min_time']),
+                                 'max_time': float(row['max_time']),
+                                 'n_rows': int(row['n_rows'])})
+        return manifest
+
+    def _write_manifest(self, filename, manifest):
+        manifest_path = self._manifest_path(filename)
+        with open(manifest_path + '.tmp', 'w', newline='') as f:
+            w = csv.DictWriter(f, fieldnames=self.MANIFEST_FIELDNAMES)
+            w.writeheader()
+            w.writerows(manifest)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    def csv_rename(self, filename, new_filename):
+        for entry in self.csv_manifest(filename):
+            self._dataio.csv_rename(
+                self._partition_name(filename, entry['partition']),
+                self._partition_name(new_filename, entry['partition']))
+        os.replace(self._manifest_path(filename),
+                   self._manifest_path(new_filename))
+
+    def csv_newfile(self, filename):
+        self._write_manifest(filename, [])
+        self._remove_journal(filename)
+
+    def csv_check(self, filename, create_file=True):
+        if os.path.exists(self._manifest_path(filename)):
+            # partitions share the schema of the file
+            manifest = self.csv_manifest(filename)
+            if len(manifest) > 0:
+                self._dataio.csv_check(
+                    self._partition_name(filename, manifest[-1]['partition']),
+                    create_file=False)
+            return True
+        if create_file:
+            self.csv_newfile(filename)
+        return False
+
+    def _journal_files(self, filename, rows):
+        appended, replaced = [], [self._manifest_path(filename)]
+        for key, run in self._split_rows(rows):
+            partition_appended, partition_replaced = \
+                self._dataio._journal_files(
+                    self._partition_name(filename, key), run)
+            appended.extend(partition_appended)
+            replaced.extend(partition_replaced)
+        return appended, replaced
+
+    def _repair(self, filename):
+        """Repair the last partition, the only one written to in order.
+        """
+        if not os.path.exists(self._manifest_path(filename)):
+            return
+        manifest = self.csv_manifest(filename)
+        if len(manifest) > 0:
+            self._dataio._repair(
+                self._partition_name(filename, manifest[-1]['partition']))
+
+    def _open_writer(self, filename):
+        return {'filename': filename,
+                'keys': set(entry['partition']
+                            for entry in self.csv_manifest(filename)),
+                'key': None,
+                'handle': None}
+
+    def _write_rows(self, handle, rows):
+        for key, run in self._split_rows(rows):
+            if key != handle['key']:
+                if handle['handle'] is not None:
+                    self._dataio._sync_writer(handle['handle'], True)
+                    self._dataio._close_writer(handle['handle'])
+                partition_name = self._partition_name(handle['filename'], key)
+                if key not in handle['keys']:
+                    self._dataio.csv_newfile(partition_name)
+                    handle['keys'].add(key)
+                handle['key'] = key
+                handle['handle'] = self._dataio._open_writer(partition_name)
+            self._dataio._write_rows(handle['handle'], run)
+
+    def _sync_writer(self, handle, fsync):
+        if handle['handle'] is not None:
+            self._dataio._sync_writer(handle['handle'], fsync)
+
+    def _close_writer(self, handle):
+        if handle['handle'] is not None:
+            self._dataio._close_writer(handle['handle'])
+
+    def _commit_rows(self, filename, rows):
+        manifest = self.csv_manifest(filename)
+        entries = {entry['partition']: entry for entry in manifest}
+        for key, run in self._split_rows(rows):
+            self._dataio._commit_rows(self._partition_name(filename, key), run)
+            if key not in entries:
+                entries[key] = {'partition': key,
+                                'min_time': float(run[0]['time']),
+                                'max_time': float(run[0]['time']),
+                                'n_rows': 0}
+                manifest.append(entries[key])
+            entries[key]['max_time'] = float(run[-1]['time'])
+            entries[key]['n_rows'] += len(run)
+        self._write_manifest(filename, manifest)
+
+    def _end_commit(self, filename, rows):
+        for key, run in self._split_rows(rows):
+            self._dataio._end_commit(self._partition_name(filename, key), run)
+
+    def csv_get(self, filename, as_arrays=False):
+        parts = [self._dataio.csv_get(
+            self._partition_name(filename, entry['partition']),
+            as_arrays=as_arrays)
+            for entry in self.csv_manifest(filename)]
+        if len(parts) == 0:
+            return self._dataio._empty_data(as_arrays)
+        return _concat_data(parts)
+
+    def csv_get_range(self, filename, start, end, as_arrays=False):
+        """Fetch rows from the last row at or before `start` up to the last
+        row at or before `end`, reading only partitions in that range.
+
+        Args:
+            filename (str): Name of file.
+            start (float): Start UNIX of rows to fetch.
+            end (float): End UNIX of rows to fetch.
+            as_arrays (bool): Passed to the wrapped backend.
+
+        Returns:
+            Rows in the format of the wrapped backend.
+        """
+        manifest = self.csv_manifest(filename)
+        if len(manifest) == 0:
+            return self._dataio._empty_data(as_arrays)
+
+        # the partition holding the last row at or before start comes first
+        min_times = [entry['min_time'] for entry in manifest]
+        first = max(numpy.searchsorted(min_times, start, 'right') - 1, 0)
+        last = max(numpy.searchsorted(min_times, end, 'right') - 1, first)
+        parts = [self._dataio.csv_get_range(
+            self._partition_name(filename, entry['partition']), start, end,
+            as_arrays=as_arrays)
+            for entry in manifest[first:last + 1]]
+        return _concat_data(parts)
+
+    def _iter_range(self, filename, start, end, chunk_rows, as_arrays):
+        manifest = self.csv_manifest(filename)
+        if len(manifest) == 0:
+            return
+
+        # the partition holding the last row at or before start comes first
+        min_times = [entry['min_time'] for entry in manifest]
+        first = max(numpy.searchsorted(min_times, start, 'right') - 1, 0)
+        last = max(numpy.searchsorted(min_times, end, 'right') - 1, first)
+        for entry in manifest[first:last + 1]:
+            for data in self._dataio.csv_iter_range(
+                    self._partition_name(filename, entry['partition']),
+                    start, end, chunk_rows, as_arrays=as_arrays):
+                yield data
+
+    def csv_get_last(self, filename):
+        manifest = self.csv_manifest(filename)
+        if len(manifest) == 0:
+            return None
+        return self._dataio.csv_get_last(
+            self._partition_name(filename, manifest[-1]['partition']))
+
+
+STORAGE_BACKENDS = {
+    'csv': DataIO,
+    'column': ColumnIO,
+    'block': BlockIO,
+}
@@ -1,5 +1,22 @@
 import numpy
 
+try:
+    from scipy.signal import lfilter
+except ImportError:
+    lfilter = None
+
+
+# Indicators computed by `indicator_matrix`. 'wilder_rsi' is `rsi` with
+# Wilder's smoothing.
+INDICATORS = ('ma', 'ema', 'dema', 'tema', 'vol', 'rsi', 'wilder_rsi')
+
+# Smoothings of average gains and losses of `rsi`.
+RSI_SMOOTHINGS = ('sma', 'wilder')
+
+# Minimum number of consecutive windows whose sums share one cumulative sum
+# in rolling statistics.
+WINDOW_CHUNK = 64
+
 
 def truncate(x, factor, mean=None, std=None):
     x = numpy.reshape(x, [-1])
@@ -31,66 +48,471 @@ def log_ratio(x, scale):
     return y
 
 
+def _window_moments(x, windows, variance=False):
+    """Compute the mean, and the variance if `variance` is set, of the last
+    `window` values at every element of `x` for each of `windows`, in O(n)
+    per block size plus one subtraction per window and element. The first
+    `window - 1` elements take the value of the first window, and if `x` is
+    shorter than a window every element takes the value over all of `x`.
+
+    Window sums are differences of cumulative sums over rows of `block`
+    consecutive windows and their preceding values, where `block` is
+    `WINDOW_CHUNK` or the power of two at or above the window. Windows of
+    one block size share the sums. Each row is shifted by its own mean, so
+    the sums only span a few windows: small moves of large values, such as
+    prices, keep their precision, and rounding errors of the mean square
+    minus the squared mean stay relative to the spread of values within a
+    row.
+
+    Returns:
+        A (means, variances) tuple of dicts keyed by window. Variances are
+        None unless `variance` is set.
+    """
+    n = len(x)
+    groups = {}
+    for window in set(windows):
+        if window <= n:
+            block = max(WINDOW_CHUNK, 1 << (window - 1).bit_length())
+            groups.setdefault(block, []).append(window)
+
+    means = {}
+    variances = {}
+    for block, group_windows in groups.items():
+        lookback = max(group_windows) - 1
+        n_blocks = -(-n // block)
+        # values cut off by the start of `x` only feed the first window - 1
+        # elements, which are replaced below
+        padded = numpy.concatenate([numpy.full(lookback, x[0]), x,
+                                    numpy.full(n_blocks * block - n, x[-1])])
+        rows = numpy.lib.stride_tricks.sliding_window_view(
+            padded, lookback + block)[::block]
+        for window in group_windows:
+            means[window] = numpy.empty(n_blocks * block)
+            variances[window] = numpy.empty(n_blocks * block)
+
+        rows_per_pass = max(1, 2 ** 20 // rows.shape[1])
+        for start in range(0, n_blocks, rows_per_pass):
+            end = min(start + rows_per_pass, n_blocks)
+            shifts = numpy.mean(rows[start:end], axis=1, keepdims=True)
+            deviations = rows[start:end] - shifts
+            zeros = numpy.zeros((end - start, 1))
+            sums = numpy.concatenate(
+                [zeros, numpy.cumsum(deviations, axis=1)], axis=1)
+            if variance:
+                squares = numpy.concatenate(
+                    [zeros, numpy.cumsum(deviations * deviations, axis=1)],
+                    axis=1)
+            heads = slice(lookback + 1, lookback + 1 + block)
+            for window in group_windows:
+                tails = slice(lookback + 1 - window,
+                              lookback + 1 - window + block)
+                row_means = (sums[:, heads] - sums[:, tails]) / window
+                means[window][start * block:end * block] = \
+                    (row_means + shifts).ravel()
+                if variance:
+                    # rounding may leave a tiny negative variance
+                    variances[window][start * block:end * block] = \
+                        numpy.maximum((squares[:, heads] -
+                                       squares[:, tails]) / window -
+                                      row_means * row_means, 0).ravel()
+        for window in group_windows:
+            means[window] = means[window][:n]
+            variances[window] = variances[window][:n]
+
+    # windows without a change of value, such as windows of zero gains,
+    # are found from counts of changes and take exact values
+    changes = numpy.concatenate([[0], numpy.cumsum(x[1:] != x[:-1])])
+    for window in windows:
+        if n < window:
+            means[window] = numpy.full(n, numpy.mean(x) if n > 0 else 0.0)
+            variances[window] = numpy.full(n, numpy.var(x) if n > 0 else 0.0)
+            continue
+        flat = changes[window - 1:] == changes[:n - window + 1]
+        means[window][window - 1:][flat] = x[window - 1:][flat]
+        variances[window][window - 1:][flat] = 0
+        means[window][:window - 1] = means[window][window - 1]
+        variances[window][:window - 1] = variances[window][window - 1]
+    if not variance:
+        variances = None
+    return means, variances
+
+
 def ma(x, window):
-    vals = []
-    for i in range(len(x)):
-        start = i - window + 1
-        end = i + 1
-        if start < 0:
-            vals.append(numpy.mean(x[:window]))
-        else:
-            vals.append(numpy.mean(x[start:end]))
-    return numpy.array(vals)
+    x = numpy.reshape(numpy.asarray(x, dtype=numpy.float64), [-1])
+    means, _ = _window_moments(x, [window])
+    return means[window]
 
 
-def ema(x, window):
-    x = numpy.reshape(x, [-1])
-    weights = numpy.exp(numpy.linspace(-1.0, 0.0, window))
-    weights /= weights.sum()
-    vals = []
-    for i in range(len(x)):
-        start = i - window + 1
-        end = i + 1
-        if start < 0:
-            vals.append(x[i])
-        else:
-            vals.append(numpy.sum(x[start:end] * weights))
-    return numpy.array(vals)
+def _exp_filter(u, decay, initial=0.0):
+    """Apply the recursion y[i] = u[i] + decay * y[i - 1], where y[-1] is
+    `initial`, with `scipy.signal.lfilter` if available. Otherwise blocks of
+    the recursion are solved in closed form, y[t] = decay ** t * (decay *
+    y[-1] + sum(u[s] / decay ** s for s <= t)), with blocks short enough
+    for the powers of `decay` to stay finite.
+    """
+    if lfilter is not None:
+        y, _ = lfilter([1.0], [1.0, -decay], u, zi=[decay * initial])
+        return y
+    if decay == 0:
+        return numpy.array(u, dtype=numpy.float64)
+    block = max(1, int(600 / -numpy.log(decay)))
+    scales = decay ** -numpy.arange(min(block, len(u)), dtype=numpy.float64)
+    y = numpy.empty(len(u))
+    for start in range(0, len(u), block):
+        part = u[start:start + block]
+        part_scales = scales[:len(part)]
+        y[start:start + len(part)] = ((numpy.cumsum(part * part_scales) +
+                                       decay * initial) / part_scales)
+        initial = y[start + len(part) - 1]
+    return y
+
 
+def ema(x, window, classic=False):
+    """Exponential moving average computed recursively in O(n).
 
-def dema(x, window):
-    ema_ = ema(x, window)
-    dema_ = ema(ema_, window)
+    By default each value weights the last `window` elements, the newest by
+    1 and the oldest by exp(-1), normalized to sum to 1, and the first
+    `window - 1` elements are returned as is. If `classic` is set, values
+    follow y[i] = alpha * x[i] + (1 - alpha) * y[i - 1] with alpha = 2 /
+    (window + 1), starting from y[0] = x[0].
+    """
+    x = numpy.reshape(numpy.asarray(x, dtype=numpy.float64), [-1])
+    if len(x) == 0:
+        return x
+    if classic:
+        alpha = 2 / (window + 1)
+        return _exp_filter(alpha * x, 1 - alpha, initial=x[0])
+    if window == 1 or len(x) < window:
+        return x.copy()
+
+    # sum of decayed values, dropping the element that leaves the window
+    decay = numpy.exp(-1 / (window - 1))
+    u = x.copy()
+    u[window:] -= decay ** window * x[:-window]
+    sums = _exp_filter(u, decay)
+    vals = x.copy()
+    vals[window - 1:] = sums[window - 1:] / numpy.sum(
+        decay ** numpy.arange(window))
+    return vals
+
+
+def dema(x, window, classic=False):
+    ema_ = ema(x, window, classic)
+    dema_ = ema(ema_, window, classic)
     return 2 * ema_ - dema_
 
 
-def tema(x, window):
-    ema_ = ema(x, window)
-    dema_ = ema(ema_, window)
-    tema_ = ema(dema_, window)
+def tema(x, window, classic=False):
+    ema_ = ema(x, window, classic)
+    dema_ = ema(ema_, window, classic)
+    tema_ = ema(dema_, window, classic)
     return 3 * ema_ - 3 * dema_ + tema_
 
 
 def vol(x, window):
-    vals = []
-    for i in range(len(x)):
-        start = i - window + 1
-        end = i + 1
-        if start < 0:
-            a = x[:window]
-            vals.append(numpy.std(a))
-        else:
-            a = x[start:end]
-            vals.append(numpy.std(a))
-    return numpy.array(vals)
+    x = numpy.reshape(numpy.asarray(x, dtype=numpy.float64), [-1])
+    _, variances = _window_moments(x, [window], variance=True)
+    return numpy.sqrt(variances[window])
 
 
-def rsi(x, window):
-    x = numpy.reshape(x, [-1])
+def _rsi_moves(x):
+    """Return the gains and losses, both non-negative, of every element of
+    `x` after the first against the previous element.
+    """
     delta = numpy.diff(x)
-    d_up, d_down = delta[1:].copy(), delta[1:].copy()
-    d_up[d_up < 0] = 0
-    d_down[d_down > 0] = 0
-    roll_rp = ma(d_up, window)
-    roll_down = ma(d_down, window)
-    return roll_rp / numpy.abs(roll_down)
+    return numpy.maximum(delta, 0), numpy.maximum(-delta, 0)
+
+
+def _rsi_averages(gains, losses, windows, smoothing):
+    """Average gains and losses over each of `windows` with `smoothing`.
+    Averages before the first full window are not valid.
+
+    Returns:
+        A (gains, losses) tuple of dicts of averages keyed by window.
+    """
+    avg_gains, _ = _window_moments(gains, windows)
+    avg_losses, _ = _window_moments(losses, windows)
+    if smoothing == 'wilder':
+        # seeded with the first simple average, then avg[i] = (avg[i - 1]
+        # * (window - 1) + move[i]) / window
+        for window in windows:
+            if len(gains) <= window:
+                continue
+            for averages, moves in ((avg_gains, gains), (avg_losses, losses)):
+                averages[window][window:] = _exp_filter(
+                    moves[window:] / window, 1 - 1 / window,
+                    initial=averages[window][window - 1])
+    return avg_gains, avg_losses
+
+
+def _rsi_values(avg_gains, avg_losses):
+    """Convert average gains and losses into RSI from 0 to 100. Without
+    gains or losses RSI is 50.
+    """
+    totals = avg_gains + avg_losses
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return numpy.where(totals > 0, 100 * avg_gains / totals, 50.0)
+
+
+def rsi(x, window, smoothing='sma'):
+    """Relative strength index from 0 to 100 in O(n), aligned to `x`. Value
+    i averages the gains and losses of the last `window` elements against
+    their previous elements, so the first `window` values are NaN.
+
+    Args:
+        x (array_like): Values, from old to new.
+        window (int): Number of gains and losses averaged.
+        smoothing (str): 'sma' for simple averages or 'wilder' for Wilder's
+            smoothing, seeded with the simple average of the first window.
+
+    Returns:
+        A numpy array of the length of `x`.
+    """
+    if smoothing not in RSI_SMOOTHINGS:
+        raise ValueError('RSI smoothing {} not found'.format(smoothing))
+    x = numpy.reshape(numpy.asarray(x, dtype=numpy.float64), [-1])
+    vals = numpy.full(len(x), numpy.nan)
+    if len(x) <= window:
+        return vals
+    gains, losses = _rsi_moves(x)
+    avg_gains, avg_losses = _rsi_averages(gains, losses, [window], smoothing)
+    vals[window:] = _rsi_values(avg_gains[window][window - 1:],
+                                avg_losses[window][window - 1:])
+    return vals
+
+
+def indicator_matrix(x, specs):
+    """Compute several indicators of `x` as the columns of one matrix. The
+    rolling means and variances of windows of similar size share one pass
+    of cumulative sums over `x`, and RSI of all windows shares the gains and
+    losses of `x`, so another window mostly costs one subtraction per
+    element. EMA, DEMA and TEMA of a window share their filter passes.
+
+    Args:
+        x (array_like): Values, from old to new.
+        specs (list of tuple): (name, window) tuples, where name is one of
+            `INDICATORS`.
+
+    Returns:
+        A numpy array of shape (len(x), len(specs)). Each column equals the
+        result of the function of its spec, e.g. `ma(x, window)`, or of
+        `rsi(x, window, 'wilder')` for 'wilder_rsi'.
+    """
+    x = numpy.reshape(numpy.asarray(x, dtype=numpy.float64), [-1])
+    for name, window in specs:
+        if name not in INDICATORS:
+            raise ValueError('Indicator {} not found'.format(name))
+
+    def windows(*names):
+        return sorted({window for name, window in specs if name in names})
+
+    if len(windows('ma', 'vol')) > 0:
+        means, variances = _window_moments(x, windows('ma', 'vol'),
+                                           variance=len(windows('vol')) > 0)
+    rsi_averages = {}
+    if len(windows('rsi', 'wilder_rsi')) > 0:
+        gains, losses = _rsi_moves(x)
+        for name, smoothing in (('rsi', 'sma'), ('wilder_rsi', 'wilder')):
+            if len(windows(name)) > 0:
+                rsi_averages[name] = _rsi_averages(gains, losses,
+                                                   windows(name), smoothing)
+    emas = {}
+
+    matrix = numpy.empty((len(x), len(specs)))
+    for i, (name, window) in enumerate(specs):
+        if name == 'ma':
+            matrix[:, i] = means[window]
+        elif name == 'vol':
+            matrix[:, i] = numpy.sqrt(variances[window])
+        elif name in ('rsi', 'wilder_rsi'):
+            avg_gains, avg_losses = rsi_averages[name]
+            matrix[:window, i] = numpy.nan
+            matrix[window:, i] = _rsi_values(
+                avg_gains[window][window - 1:],
+                avg_losses[window][window - 1:])
+        else:
+            # EMA of the input, then of the EMA and of that for DEMA and TEMA
+            if window not in emas:
+                emas[window] = [ema(x, window)]
+            passes = emas[window]
+            depth = {'ema': 1, 'dema': 2, 'tema': 3}[name]
+            while len(passes) < depth:
+                passes.append(ema(passes[-1], window))
+            if name == 'ema':
+                matrix[:, i] = passes[0]
+            elif name == 'dema':
+                matrix[:, i] = 2 * passes[0] - passes[1]
+            else:
+                matrix[:, i] = 3 * passes[0] - 3 * passes[1] + passes[2]
+    return matrix
+
+
+class OnlineEMA:
+    """Exponential moving average updated one value at a time in O(1). The
+    values returned equal those of `ema` over all values seen so far, up to
+    rounding if `ema` runs without scipy.
+    """
+
+    def __init__(self, window, classic=False):
+        if window < 1:
+            raise ValueError('window must be positive')
+        self._window = window
+        self._classic = classic
+        self._n = 0
+        self._state = 0.0
+        if classic:
+            self._alpha = 2 / (window + 1)
+            self._decay = 1 - self._alpha
+        elif window > 1:
+            # last `window` values, of which the oldest leaves the sum
+            self._values = numpy.zeros(window)
+            self._decay = numpy.exp(-1 / (window - 1))
+            self._drop = self._decay ** window
+            self._norm = numpy.sum(self._decay ** numpy.arange(window))
+
+    def update(self, x):
+        x = float(x)
+        if self._classic:
+            if self._n == 0:
+                self._state = x
+            self._n += 1
+            self._state = self._alpha * x + self._decay * self._state
+            return self._state
+        if self._window == 1:
+            self._n += 1
+            return x
+
+        slot = self._n % self._window
+        u = x
+        if self._n >= self._window:
+            u = x - self._drop * self._values[slot]
+        self._state = u + self._decay * self._state
+        self._values[slot] = x
+        self._n += 1
+        if self._n < self._window:
+            return x
+        return self._state / self._norm
+
+    def update_many(self, xs):
+        return numpy.array([self.update(x) for x in xs], dtype=numpy.float64)
+
+
+class _OnlineWindow:
+    """Mean and variance of the last `window` values, updated in O(1) by
+    adding the new value and removing the oldest one. The sums are
+    recomputed from the kept values once every `window` updates, so rounding
+    errors do not build up, and windows without a change of value take
+    exact values as in `ma` and `vol`.
+    """
+
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError('window must be positive')
+        self._window = window
+        self._values = numpy.zeros(window)
+        self._n = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._last = None
+        self._last_change = 0
+
+    def _update(self, x):
+        """Add a value and return True once a full window is held.
+        """
+        x = float(x)
+        slot = self._n % self._window
+        if self._n > 0 and x != self._last:
+            self._last_change = self._n
+        if self._n < self._window:
+            count = self._n + 1
+            delta = x - self._mean
+            self._mean += delta / count
+            self._m2 += delta * (x - self._mean)
+        else:
+            old = self._values[slot]
+            mean = self._mean
+            self._mean = mean + (x - old) / self._window
+            self._m2 += (x - old) * (x - self._mean + old - mean)
+        self._values[slot] = x
+        self._last = x
+        self._n += 1
+
+        if self._n < self._window:
+            return False
+        if self._last_change <= self._n - self._window:
+            # no change of value within the window
+            self._mean = x
+            self._m2 = 0.0
+        elif self._n % self._window == 0:
+            self._mean = numpy.mean(self._values)
+            self._m2 = numpy.sum((self._values - self._mean) ** 2)
+        return True
+
+    def update_many(self, xs):
+        return numpy.array([self.update(x) for x in xs], dtype=numpy.float64)
+
+
+class OnlineMA(_OnlineWindow):
+    """Moving average updated one value at a time in O(1). Values equal those
+    of `ma` up to rounding, except that the first `window - 1` values, which
+    `ma` fills with the mean of the first full window, are NaN.
+    """
+
+    def update(self, x):
+        if not self._update(x):
+            return numpy.nan
+        return self._mean
+
+
+class OnlineRollingStd(_OnlineWindow):
+    """Rolling standard deviation updated one value at a time in O(1).
+    Values equal those of `vol` up to rounding, except that the first
+    `window - 1` values are NaN.
+    """
+
+    def update(self, x):
+        if not self._update(x):
+            return numpy.nan
+        return numpy.sqrt(max(self._m2 / self._window, 0.0))
+
+
+class OnlineRSI:
+    """RSI updated one value at a time in O(1). Values equal those of `rsi`
+    with the same smoothing, up to rounding.
+    """
+
+    def __init__(self, window, smoothing='sma'):
+        if smoothing not in RSI_SMOOTHINGS:
+            raise ValueError('RSI smoothing {} not found'.format(smoothing))
+        self._window = window
+        self._smoothing = smoothing
+        self._gains = OnlineMA(window)
+        self._losses = OnlineMA(window)
+        # Wilder's averages once the first window is full
+        self._avg_gain = None
+        self._avg_loss = None
+        self._last = None
+
+    def update(self, x):
+        x = float(x)
+        last, self._last = self._last, x
+        if last is None:
+            return numpy.nan
+        gain, loss = max(x - last, 0.0), max(last - x, 0.0)
+
+        if self._avg_gain is not None:
+            decay = 1 - 1 / self._window
+            self._avg_gain = gain / self._window + decay * self._avg_gain
+            self._avg_loss = loss / self._window + decay * self._avg_loss
+            avg_gain, avg_loss = self._avg_gain, self._avg_loss
+        else:
+            avg_gain = self._gains.update(gain)
+            avg_loss = self._losses.update(loss)
+            if numpy.isnan(avg_gain):
+                return numpy.nan
+            if self._smoothing == 'wilder':
+                self._avg_gain, self._avg_loss = avg_gain, avg_loss
+        return float(_rsi_values(numpy.float64(avg_gain), avg_loss))
+
+    def update_many(self, xs):
+        return numpy.array([self.update(x) for x in xs], dtype=numpy.float64)
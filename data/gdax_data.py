@@ -3,8 +3,7 @@ import time
 import requests
 
 import base_data
-from dataio import DataIO
-import numpy as np
+import chartutil
 import timeutil
 
 
@@ -20,12 +19,28 @@ class Gdax(base_data.BaseExchange):
         'price',  # native
         'side'  # native
     ]
+
+    # Column types used by binary storage backends. Tuples list the
+    # categories of a column stored as small-int codes. Times are stored as
+    # int64 microseconds.
+    DTYPES = {
+        'date': 'S32',
+        'time': base_data.TIME_DTYPE,
+        'trade_id': 'int64',
+        'size': 'float64',
+        'price': 'float64',
+        'side': ('buy', 'sell')
+    }
     __MAX_LIMIT = 100  # API limit on maximum trades returned
     __BASE_URL = 'https://api.gdax.com'  # base API url
 
-    def __init__(self, savedir='exchange_data\\gdax', timeout=600):
+    def __init__(self, savedir='exchange_data\\gdax', timeout=600,
+                 storage='csv', partition=None, fixed_point=None):
         self._savedir = savedir
         self._timeout = timeout
+        self._storage = storage
+        self._partition = partition
+        self._fixed_point = fixed_point or {}
 
     def __get(self, path, payload, max_retries=100):
         r = None
@@ -126,222 +141,100 @@ class Gdax(base_data.BaseExchange):
             start (int): Start UNIX of trade data to download.
             end (int): End UNIX of trade data to download.
         """
-        dataio = DataIO(savedir=self._savedir, fieldnames=self.FIELDNAMES)
-        if dataio.csv_check(pair):
-            last_row = dataio.csv_get_last(pair)
+        dataio = self._get_dataio(pair)
+        # undo an interrupted commit before the resume point is read, or
+        # its rows would be skipped
+        dataio.csv_check(pair)
+        dataio.csv_recover(pair)
+        last_row = dataio.csv_get_last(pair)
+        if last_row is not None:
             newest_id = int(last_row['trade_id']) + 1
-            newest_t = int(last_row['time'])
+            newest_t = float(last_row['time'])
         else:
             newest_id = self.__find_start_trade_id(pair, start)
             newest_t = 0
 
         last_trade_id = self.__find_last_trade_id(pair)
 
-        while newest_t < end:
-            # new -> old
-            r = self.__get_slice(pair, newest_id + self.__MAX_LIMIT)
-
-            # break condition
-            to_break = False
-
-            # old -> new, add unix timestamp
-            new_r = []
-            for row in reversed(r):
-                if row['trade_id'] > newest_id:
-                    row['date'] = row['time']
-                    row['time'] = timeutil.iso_to_unix(row['time'])
-                    new_r.append(row)
-                if row['trade_id'] == last_trade_id:
-                    to_break = True
-
-            # save to file
-            dataio.csv_append(pair, new_r)
-
-            # break condition
-            if to_break:
-                break
-
-            # prepare next iteration
-            newest_id = new_r[-1]['trade_id']
-            newest_t = new_r[-1]['time']
-            print('GDAX\t| {} : {}'.format(
-                timeutil.unix_to_iso(newest_t), pair))
+        with dataio.csv_writer(pair) as writer:
+            while newest_t < end:
+                # new -> old
+                r = self.__get_slice(pair, newest_id + self.__MAX_LIMIT)
+
+                # break condition
+                to_break = False
+
+                # old -> new, add unix timestamp
+                new_r = []
+                for row in reversed(r):
+                    if row['trade_id'] > newest_id:
+                        row['date'] = row['time']
+                        row['time'] = timeutil.iso_to_unix_float(
+                            row['time'])
+                        new_r.append(row)
+                    if row['trade_id'] == last_trade_id:
+                        to_break = True
+
+                # save to file
+                writer.append(new_r)
+
+                # break condition
+                if to_break:
+                    break
+
+                # prepare next iteration
+                newest_id = new_r[-1]['trade_id']
+                newest_t = new_r[-1]['time']
+                print('GDAX\t| {} : {}'.format(
+                    timeutil.unix_to_iso(newest_t), pair))
 
         print('GDAX\t| Download complete : {}'.format(pair))
 
-    def get_trades(self, pair, start, end):
+    def get_trades(self, pair, start, end, as_arrays=False):
         """Get trade data from .csv file.
 
         Args:
             pair (str): Currency pair.
             start (int): Start UNIX of trade data to fetch.
             end (int): End UNIX of trade data to fetch.
+            as_arrays (bool): Return typed numpy arrays. Column storage
+                returns views of memory-mapped files. Fixed-point columns
+                are returned as int64 multiples of their step, and times as
+                int64 microseconds.
 
         Returns:
             List of trade events, from old to new data.
         """
-        dataio = DataIO(savedir=self._savedir, fieldnames=self.FIELDNAMES)
+        dataio = self._get_dataio(pair)
         if dataio.csv_check(pair):
-            data = dataio.csv_get(pair)
+            data = dataio.csv_get_range(pair, start, end,
+                                        as_arrays=as_arrays)
         else:
             raise ValueError(
                 'GDAX\t| No trades downloaded: {}'.format(pair))
 
-        # look for start and end row indices
-        start_index = None
-        end_index = None
-        for i, timestamp in enumerate(data['time']):
-            if float(timestamp) <= float(start):
-                start_index = i
-            if float(timestamp) <= float(end):
-                end_index = i
-
-        # filter by requested date range
-        new_data = {}
-        for col_name in data:
-            new_data[col_name] = data[col_name][start_index: (end_index + 1)]
-        return new_data
-
-    def get_charts(self, pair, start, end, interval=60):
+        return data
+
+    def get_charts(self, pair, start, end, interval=60, as_arrays=False):
         """Convert trade data to OHLC format.
 
         Args:
             pair (str): Currency pair.
             start (int): Start UNIX of chart data to fetch.
             end (int): End UNIX of chart data to fetch.
-            interval (int): Interval, in seconds.
+            interval (float): Interval, in seconds. Fractional intervals
+                such as 0.1 build sub-second ticks.
+            as_arrays (bool): Return numpy arrays instead of lists.
 
         Returns:
             List of ticks, from old to new data.
         """
         # get trade data, from oldest to newest trades
-        trade_data = self.get_trades(pair, start, end)
-        chart_data = {
-            'time': [],
-            'open': [],
-            'high': [],
-            'low': [],
-            'close': [],
-            'volume': [],
-            'weighted_average': [],
-            'n_trades': [],
-            'n_sells': [],
-            'sell_volume': [],
-            'sell_weighted_average': [],
-            'n_buys': [],
-            'buy_volume': [],
-            'buy_weighted_average': [],
-        }
-
-        # bucket trade data into intervals
-        timepoints = np.arange(start + interval, end, interval)
-        index = 0
-        for t in timepoints:
-            lower_t = t - interval + 1  # exclusive
-            upper_t = t  # inclusive
-
-            # collect all trade data between lower_t and upper_t
-            bucket = {label: [] for label in self.FIELDNAMES}
-            while (index < len(trade_data['time']) and
-                   float(trade_data['time'][index]) <= float(upper_t)):
-                if float(trade_data['time'][index]) >= float(lower_t):
-                    for label in trade_data:
-                        bucket[label].append(trade_data[label][index])
-                index += 1
-
-            # process trades into tick
-            tick = {}
-            tick['time'] = upper_t
-
-            if len(bucket['time']) > 0:
-                # collect OHLC data from trades
-                prices = np.asarray(bucket['price'], dtype=np.float32)
-                sizes = np.asarray(bucket['size'], dtype=np.float32)
-
-                # set current opening price to last closing price
-                if len(chart_data['close']) > 0:
-                    carry_forward_price = chart_data['close'][-1]
-                else:
-                    carry_forward_price = prices[0]
-
-                # calculate chart OHLC
-                tick['open'] = carry_forward_price
-                tick['high'] = np.max(prices)
-                tick['low'] = np.min(prices)
-                tick['close'] = prices[-1]
-                tick['volume'] = np.sum(sizes)
-                tick['weighted_average'] = (np.sum(prices * sizes) /
-                                            tick['volume'])
-
-                # collect trade sell/buy volume and prices
-                buy_sizes = np.asarray(
-                    [size for size, side in
-                     zip(bucket['size'],
-                         bucket['side']) if side == 'buy' or side == 'b'],
-                    dtype=np.float32)
-                buy_prices = np.asarray(
-                    [price for price, side in
-                     zip(bucket['price'],
-                         bucket['side']) if side == 'buy' or side == 'b'],
-                    dtype=np.float32)
-                sell_prices = np.asarray(
-                    [price for price, side in
-                     zip(bucket['price'],
-                         bucket['side']) if side == 'sell' or side == 's'],
-                    dtype=np.float32)
-                sell_sizes = np.asarray(
-                    [size for size, side in
-                     zip(bucket['size'],
-                         bucket['side']) if side == 'sell' or side == 's'],
-                    dtype=np.float32)
-
-                # calculate chart sell/buy volume and weighted average
-                if len(buy_sizes) > 0:
-                    tick['buy_volume'] = np.sum(buy_sizes)
-                    tick['buy_weighted_average'] = (np.sum(buy_prices * buy_sizes) /
-                                                    tick['buy_volume'])
-                else:
-                    tick['buy_volume'] = 0
-                    tick['buy_weighted_average'] = carry_forward_price
-                if len(sell_sizes) > 0:
-                    tick['sell_volume'] = np.sum(sell_sizes)
-                    tick['sell_weighted_average'] = (np.sum(sell_prices * sell_sizes) /
-                                                     tick['sell_volume'])
-                else:
-                    tick['sell_volume'] = 0
-                    tick['sell_weighted_average'] = carry_forward_price
-
-                # total number of trades
-                tick['n_buys'] = len(buy_sizes)
-                tick['n_sells'] = len(sell_sizes)
-                tick['n_trades'] = tick['n_sells'] + tick['n_buys']
-
-            # carry forward relevant info if no trades within the interval
-            else:
-                if len(chart_data['close']) > 0:
-                    carry_forward_price = chart_data['close'][-1]
-                else:
-                    carry_forward_price = 0
-
-                tick['low'] = carry_forward_price
-                tick['high'] = carry_forward_price
-                tick['open'] = carry_forward_price
-                tick['close'] = carry_forward_price
-                tick['volume'] = 0
-                tick['weighted_average'] = carry_forward_price
-                tick['sell_volume'] = 0
-                tick['sell_weighted_average'] = carry_forward_price
-                tick['buy_volume'] = 0
-                tick['buy_weighted_average'] = carry_forward_price
-                tick['n_sells'] = 0
-                tick['n_buys'] = 0
-                tick['n_trades'] = 0
-
-            # collect tick data
-            for label in tick:
-                chart_data[label].append(tick[label])
-
-        return chart_data
+        trade_data = self.get_trades(pair, start, end, as_arrays=True)
+        return chartutil.build_charts(trade_data, start, end, interval,
+                                      self.CHART_FIELDS, as_arrays=as_arrays,
+                                      steps=self._get_steps(
+                                          pair, self.CHART_FIELDS))
 
     def get_pairs(self):
         """Returns all currency pairs supported by the exchange.
@@ -0,0 +1,49 @@
+import random
+
+from chartcache import ChartCache
+from kraken_data import Kraken
+import timeutil
+
+if __name__ == '__main__':
+    # trades with sub-second times, stored as downloaded by the client
+    rnd = random.Random(0)
+    times = sorted(1500000000 + rnd.randint(0, 36000000) / 1000
+                   for _ in range(2000))
+    trades = [{'date': timeutil.unix_to_iso(unix), 'time': unix,
+               'size': round(rnd.random() * 3, 4),
+               'price': round(100 + rnd.random() * 10, 2),
+               'side': rnd.choice(['b', 's']), 'order_type': 'l'}
+              for unix in times]
+    client = Kraken(savedir='test', storage='column')
+    client._get_dataio('XXBTZUSD').csv_newfile('XXBTZUSD')
+    client._get_dataio('XXBTZUSD').csv_append('XXBTZUSD', trades)
+
+    # buckets of whole and fractional alignments are stored in separate
+    # files, so each equals ticks built from trades
+    cache = ChartCache(savedir='test\\charts')
+    end = times[-1] + 60
+    for start in (1500000000, 1500000000.5, 1500000000.1):
+        cached = cache.get_charts(client, 'kraken', 'XXBTZUSD', start, end, 60)
+        built = client.get_charts('XXBTZUSD', start, end, 60)
+        print(start, cached == built)
+
+    # the same trades stored as fixed-point multiples of other steps
+    # replace the stored buckets instead of mixing with them
+    fixed_client = Kraken(savedir='test\\fixed', storage='column',
+                          fixed_point={'XXBTZUSD': {'price': 0.01,
+                                                    'size': 0.0001}})
+    fixed_client._get_dataio('XXBTZUSD').csv_newfile('XXBTZUSD')
+    fixed_client._get_dataio('XXBTZUSD').csv_append('XXBTZUSD', trades)
+    for steps_client in (fixed_client, client):
+        cached = cache.get_charts(steps_client, 'kraken', 'XXBTZUSD',
+                                  1500000000, end, 60)
+        built = steps_client.get_charts('XXBTZUSD', 1500000000, end, 60)
+        print(cached == built)
+
+    # whole seconds given as float share the buckets of int intervals,
+    # including intervals merged from finer levels
+    for interval in (120, 120.0, 60.0):
+        cached = cache.get_charts(client, 'kraken', 'XXBTZUSD', 1500000000,
+                                  end, interval)
+        built = client.get_charts('XXBTZUSD', 1500000000, end, interval)
+        print(interval, cached == built)
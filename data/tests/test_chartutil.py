@@ -0,0 +1,42 @@
+import chartutil
+
+if __name__ == '__main__':
+    # trade times are int64 microseconds, as stored by the clients
+    trade_data = {
+        'time': [61000000, 90000000, 119000000, 200000000, 241000000],
+        'price': [100.0, 102.0, 101.0, 103.0, 99.0],
+        'size': [1.0, 2.0, 1.0, 0.5, 3.0],
+        'side': ['buy', 'sell', 'buy', 'sell', 'b'],
+    }
+
+    # one tick per minute, empty ticks carry the last close forward
+    charts = chartutil.build_charts(trade_data, 0, 360, 60)
+    for key in charts:
+        print(key, charts[key])
+
+    # bucket aggregates of the same ticks
+    timepoints = charts['time']
+    agg = chartutil.aggregate(trade_data, timepoints, 60)
+    print(agg)
+    print(chartutil.finalize(agg, timepoints, last_close=98.0))
+
+    # merge pairs of one-minute buckets into two-minute buckets
+    print(chartutil.rollup(agg, 2))
+
+    # one-minute and two-minute ticks from a single aggregation
+    print(chartutil.build_charts_multi(trade_data, 0, 360, [60, 120]))
+
+    # bars of two trades and of 3 units of size
+    print(chartutil.build_bars(trade_data, 'tick', 2))
+    print(chartutil.build_bars(trade_data, 'volume', 3.0))
+
+    # 100 ms ticks around the second trade
+    print(chartutil.build_charts(trade_data, 89.7, 90.2, 0.1))
+
+    # the same one-minute ticks from chunks of two trades, at most four
+    # ticks at a time
+    trade_chunks = [{key: trade_data[key][i:i + 2] for key in trade_data}
+                    for i in range(0, 5, 2)]
+    for chart_data in chartutil.iter_build_charts(
+            trade_chunks, 0, 360, 60, chunk_buckets=4):
+        print(chart_data['time'], chart_data['close'])
@@ -1,5 +1,5 @@
 import numpy
-from dataio import DataIO
+from dataio import DataIO, FixedPoint, get_dataio
 
 if __name__ == '__main__':
 
@@ -27,4 +27,41 @@ if __name__ == '__main__':
     data = csvio.csv_get(filename)
     print(data)
 
-    csvio.csv_rename(filename, 'test2')
\ No newline at end of file
+    csvio.csv_rename(filename, 'test2')
+
+    # binary column storage
+    dtypes = {'time': 'float64', 'low': 'int64', 'high': 'int64'}
+    colio = get_dataio('test', fieldnames, dtypes, storage='column')
+    colio.csv_newfile(filename)
+    colio.csv_append(filename, test_row1)
+    colio.csv_append(filename, test_rows)
+    print(colio.csv_get(filename))
+    print(colio.csv_get_last(filename))
+    print(colio.csv_get_range(filename, 1.0, 3.0, as_arrays=True))
+    for chunk in colio.csv_iter_range(filename, 0.0, 4.0, chunk_rows=2):
+        print(chunk)
+
+    # prices stored as int64 multiples of a tick size
+    fixed_dtypes = dict(dtypes, low=FixedPoint(0.5), high=FixedPoint(0.5))
+    fixedio = get_dataio('test', fieldnames, fixed_dtypes, storage='column')
+    fixedio.csv_newfile(filename)
+    fixedio.csv_append(filename, test_rows)
+    print(fixedio.csv_get(filename, as_arrays=True))
+    print(fixedio.csv_get(filename))
+
+    # a download killed after rows reach disk but before their commit
+    # resumes from the last committed row
+    test_row5 = {'time': 5.0, 'low': 104, 'high': 105}
+    for storage in ('csv', 'column', 'block'):
+        crashio = get_dataio('test', fieldnames, dtypes, storage=storage)
+        crashio.csv_newfile(filename)
+        crashio.csv_append(filename, test_rows)
+        crashio._begin_commit(filename, [test_row5], False)
+        handle = crashio._open_writer(filename)
+        crashio._write_rows(handle, [test_row5])
+        crashio._sync_writer(handle, False)
+        crashio._close_writer(handle)
+
+        crashio.csv_check(filename)
+        crashio.csv_recover(filename)
+        print(storage, crashio.csv_get_last(filename))
@@ -0,0 +1,35 @@
+import numpy
+
+import datautil
+
+if __name__ == '__main__':
+    x = numpy.array([1.0, 2.0, 4.0, 4.0, 4.0, 3.0, 5.0, 8.0])
+
+    # the first window - 1 elements take the value of the first window
+    print('ma:', datautil.ma(x, 3))
+    print('vol:', datautil.vol(x, 3))
+
+    # series shorter than the window take the value of all elements
+    print('ma:', datautil.ma(x[:2], 3))
+    print('vol:', datautil.vol(x[:2], 3))
+
+    # finite window weighting and classic alpha = 2 / (window + 1)
+    print('ema:', datautil.ema(x, 3))
+    print('ema:', datautil.ema(x, 3, classic=True))
+    print('tema:', datautil.tema(x, 3, classic=True))
+
+    # several indicators and windows as the columns of one matrix
+    print(datautil.indicator_matrix(x, [('ma', 2), ('ma', 3), ('vol', 3),
+                                        ('ema', 3), ('rsi', 2),
+                                        ('wilder_rsi', 2)]))
+
+    # RSI from 0 to 100, NaN until the first window of gains and losses
+    print('rsi:', datautil.rsi(x, 2))
+    print('rsi:', datautil.rsi(x, 2, smoothing='wilder'))
+
+    # streaming indicators updated one value at a time
+    online_ema = datautil.OnlineEMA(3)
+    print('online ema:', [online_ema.update(value) for value in x])
+    print('online vol:', datautil.OnlineRollingStd(3).update_many(x))
+    print('online rsi:', datautil.OnlineRSI(2).update_many(x))
+    print('online rsi:', datautil.OnlineRSI(2, 'wilder').update_many(x))
@@ -18,6 +18,8 @@ if __name__ == '__main__':
     print('iso conversion:', unix_1)
     print('iso conversion:', utc_date_1)
     print('iso conversion:', local_date_1)
+    print('iso conversion:',
+          timeutil.iso_to_unix_float('2017-07-14T02:40:00.123456Z'))
 
     # utc_date to ...
     unix_2 = timeutil.utc_date_to_unix(utc_date)
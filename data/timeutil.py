@@ -19,6 +19,10 @@ def iso_to_unix(iso):
     return int(iso_to_utc_date(iso).timestamp())
 
 
+def iso_to_unix_float(iso):
+    return iso_to_utc_date(iso).timestamp()
+
+
 def iso_to_utc_date(iso):
     return parser.parse(iso).replace(tzinfo=tz.tzutc())
 